@@ -0,0 +1,2 @@
+# 他のモジュールが環境変数を読む前に .env を読み込む (app/config.py)
+from app import config  # noqa: F401
@@ -1,4 +1,6 @@
 # from passlib.context import CryptContext
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,6 +8,9 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from . import metrics
+from .cache import LRUCache
+from .config import get_settings
 from .database import get_db
 from .models import User
 import bcrypt
@@ -18,12 +23,33 @@ import os
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # JWT設定
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
+SECRET_KEY = get_settings().secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300 # 開発用に長めに設定
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# 認証済みユーザーのキャッシュ (トークンのsub(email) -> User)
+# 管理画面は1ページで何度も認証付きAPIを呼ぶため、短時間だけDB検索を省略します
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+_user_cache = LRUCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL_SECONDS)
+
+# 認証のためにDBを検索した回数 (キャッシュの効果確認用。/metrics の auth_user_db_lookups_total)
+auth_db_lookups = metrics.Counter("auth_user_db_lookups_total", "Authenticated requests that looked the user up in the database")
+
+def invalidate_user(email: str):
+    """ユーザー情報の変更・削除時に呼び出し、キャッシュから取り除く"""
+    _user_cache.pop(email)
+
+def clear_user_cache():
+    """ユーザーキャッシュを全て破棄する"""
+    _user_cache.clear()
+
+def user_cache_stats() -> dict:
+    """ユーザーキャッシュの統計情報"""
+    return {**_user_cache.stats(), "db_lookups": int(auth_db_lookups.value())}
+
 def verify_password(plain_password, hashed_password):
     """パスワードが一致するか検証"""
     # bcryptはbytesを要求するためencode/decodeが必要
@@ -35,6 +61,38 @@ def get_password_hash(password):
     hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
     return hashed.decode('utf-8')
 
+# bcryptは1回あたり100〜300msのCPUを使うため、専用のスレッドプールで実行してイベントループを止めない
+# (bcryptは計算中にGILを解放します)
+# 同時に実行するハッシュ計算の上限。ログインが集中してもCPUを使い切らないよう小さめにする
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY", "2"))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_CONCURRENCY, thread_name_prefix="bcrypt")
+# 実行中 + 待機中のハッシュ計算の数
+_bcrypt_pending = 0
+
+async def _run_bcrypt(func, *args):
+    global _bcrypt_pending
+    _bcrypt_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, func, *args)
+    finally:
+        _bcrypt_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password を専用スレッドで実行する (async関数内ではこちらを使う)"""
+    return await _run_bcrypt(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash を専用スレッドで実行する (async関数内ではこちらを使う)"""
+    return await _run_bcrypt(get_password_hash, password)
+
+def bcrypt_stats() -> dict:
+    """bcryptのスレッドプールの状態"""
+    return {
+        "max_concurrency": BCRYPT_MAX_CONCURRENCY,
+        "in_flight": min(_bcrypt_pending, BCRYPT_MAX_CONCURRENCY),
+        "queue_depth": max(_bcrypt_pending - BCRYPT_MAX_CONCURRENCY, 0), # 空きスレッド待ちの数
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """JWTアクセストークンを作成"""
     to_encode = data.copy()
@@ -50,6 +108,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     """
     現在のログインユーザーを取得・検証する依存関係関数
     ルート保護に使用します (Depends(get_current_user))
+    トークンの検証は毎回行い、ユーザーのDB検索結果だけを短時間キャッシュします
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,10 +123,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
+    user = _user_cache.get(email)
+    if user is not None:
+        return user
+
     # DBからユーザーを取得
+    auth_db_lookups.inc()
     result = await db.execute(select(User).filter(User.email == email))
     user = result.scalars().first()
     
     if user is None:
         raise credentials_exception
+    _user_cache.set(email, user)
     return user
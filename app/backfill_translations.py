@@ -0,0 +1,62 @@
+"""
+既存の記事を新しく追加した言語に翻訳するコマンド
+
+TRANSLATION_LANGUAGES に言語を追加しても、既にある記事には翻訳がありません。
+このコマンドは翻訳が足りない記事を探し、複数件まとめてGeminiで翻訳して保存します。
+チェックポイントファイルに進捗を保存するため、中断しても同じコマンドで続きから再開できます。
+
+実行方法 (プロジェクトルートで):
+    python -m app.backfill_translations --lang th --lang vi
+    python -m app.backfill_translations                     # TRANSLATION_LANGUAGES の全言語
+    python -m app.backfill_translations --lang th --dry-run # 件数だけ確認
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+from app.languages import TRANSLATION_LANGUAGES, get_language, parse_languages
+from app.services import translation_backfill_service
+
+async def run(args: argparse.Namespace):
+    if args.lang:
+        try:
+            languages = [get_language(code) for code in args.lang]
+        except KeyError:
+            # TRANSLATION_LANGUAGES にない言語も "th:Thai" 形式や既知の言語コードなら指定できる
+            languages = parse_languages(",".join(args.lang))
+    else:
+        languages = TRANSLATION_LANGUAGES
+
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.dry_run:
+                count = await translation_backfill_service.count_missing(db, languages)
+                print(f"{count} posts are missing translations for {[lang.code for lang in languages]}")
+                return
+            checkpoint = await translation_backfill_service.backfill(
+                db,
+                languages,
+                checkpoint_path=args.checkpoint,
+                posts_per_request=args.batch_size,
+                concurrency=args.concurrency,
+                max_posts=args.max_posts,
+            )
+        print(f"Done: {checkpoint.translated_posts} posts translated, {checkpoint.written_rows} rows written, "
+              f"{len(checkpoint.failed_post_ids)} failed")
+        if checkpoint.failed_post_ids:
+            print(f"Failed posts: {checkpoint.failed_post_ids} (delete {args.checkpoint} and run again to retry)")
+    finally:
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lang", action="append", help="翻訳する言語コード (複数指定可。省略時は TRANSLATION_LANGUAGES の全言語)")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json", help="進捗を保存するファイル")
+    parser.add_argument("--batch-size", type=int, default=translation_backfill_service.BACKFILL_POSTS_PER_REQUEST, help="1リクエストで翻訳する記事数")
+    parser.add_argument("--concurrency", type=int, default=translation_backfill_service.BACKFILL_CONCURRENCY, help="同時リクエスト数")
+    parser.add_argument("--max-posts", type=int, default=None, help="今回処理する最大記事数 (試験実行用)")
+    parser.add_argument("--dry-run", action="store_true", help="翻訳が足りない記事の件数だけを表示する")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
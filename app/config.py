@@ -0,0 +1,52 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# アプリケーション全体の設定
+# .env ファイルはここで1回だけ読み込みます (既に設定されている環境変数は上書きしません)。
+# app パッケージの読み込み時 (app/__init__.py) に実行されるため、
+# 各モジュールが os.getenv で読む調整用の値 (FEED_CACHE_PAGES など) にも .env の内容が反映されます。
+load_dotenv()
+
+def _flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+@dataclass(frozen=True)
+class Settings:
+    """接続先・認証情報など、複数のモジュールで使う設定"""
+    # データベース接続URL (デフォルトはSQLite)
+    database_url: str
+    # SQLをログに出力するか (開発時のデバッグ用。本番では無効のままにしてください)
+    sql_echo: bool
+    # 起動時のスキーマの扱い
+    # migrate: 未適用のマイグレーションを適用する (開発用の既定値)
+    # check:   バージョンを確認するだけでDDLは実行しない (本番ではデプロイ時に python -m app.migrations upgrade を実行)
+    db_schema_mode: str
+    # Google Gemini API
+    gemini_api_key: Optional[str]
+    gemini_model: str
+    # JWTの署名鍵
+    secret_key: str
+    # ユーザー登録の招待コード (未設定の場合は登録できません)
+    invite_code: Optional[str]
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            database_url=os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./kamitouri.db"),
+            sql_echo=_flag("SQL_ECHO"),
+            db_schema_mode=os.getenv("DB_SCHEMA_MODE", "migrate"),
+            gemini_api_key=os.getenv("GEMINI_API_KEY"),
+            # 使用するAIモデル (ユーザー指定: 2.5 flash lite)
+            gemini_model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"),
+            secret_key=os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production"),
+            invite_code=os.getenv("INVITE_CODE") or None,
+        )
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """設定を返す (最初の呼び出しで環境変数から読み込み、以降は同じオブジェクトを返す)"""
+    return Settings.from_env()
@@ -1,20 +1,23 @@
-import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from dotenv import load_dotenv
 
-# .envファイルを読み込む
-load_dotenv()
+from app.config import get_settings
+from app.metrics import instrument_engine
+
+settings = get_settings()
 
 # データベース接続URLを取得 (デフォルトはSQLite)
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./kamitouri.db")
+DATABASE_URL = settings.database_url
 
 # 非同期エンジンを作成
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True, # 開発中はSQLログを出力 (本番ではFalse推奨)
+    echo=settings.sql_echo, # SQLログは SQL_ECHO=true の場合だけ出力する (開発時のデバッグ用)
 )
 
+# SQLの実行回数・実行時間を計測する (/metrics と遅いリクエストのログで使用)
+instrument_engine(engine.sync_engine)
+
 # 非同期セッションファクトリ
 # これを使ってデータベースとのセッションを作成します
 AsyncSessionLocal = async_sessionmaker(
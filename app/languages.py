@@ -0,0 +1,58 @@
+import os
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class Language:
+    """翻訳対象の言語"""
+    code: str # Translation.language に保存する言語コード (例: 'zh-tw')
+    name: str # プロンプトに書く言語名 (例: 'Traditional Chinese')
+
+    @property
+    def response_key(self) -> str:
+        """AIのJSONレスポンスでのキー名 (例: 'zh_tw')"""
+        return self.code.replace("-", "_")
+
+# 記事の元になる言語 (AIが生成した日本語の投稿文は "ja" の翻訳として保存する)
+SOURCE_LANGUAGE = Language("ja", "Japanese")
+
+# 言語コード -> 言語名
+# TRANSLATION_LANGUAGES で指定できる言語です。ここにない言語は "th:Thai" のように名前付きで指定してください
+KNOWN_LANGUAGES = {
+    "en": "English",
+    "zh-tw": "Traditional Chinese",
+    "zh-cn": "Simplified Chinese",
+    "ko": "Korean",
+    "th": "Thai",
+    "vi": "Vietnamese",
+    "fr": "French",
+    "de": "German",
+    "es": "Spanish",
+    "id": "Indonesian",
+}
+
+def parse_languages(spec: str) -> list[Language]:
+    """
+    "en,zh-tw,th:Thai" 形式の文字列を言語のリストにする
+    """
+    languages = []
+    for item in spec.split(","):
+        code, _, name = item.strip().partition(":")
+        code = code.strip().lower()
+        if not code:
+            continue
+        name = name.strip() or KNOWN_LANGUAGES.get(code)
+        if not name:
+            raise ValueError(f"Unknown language code '{code}'. Use '{code}:<Language name>'")
+        languages.append(Language(code, name))
+    return languages
+
+# 翻訳する言語 (記事作成時のAIプロンプトとレスポンス形式はここから作られます)
+# 言語を追加した場合、既存の記事は python -m app.backfill_translations で翻訳してください
+TRANSLATION_LANGUAGES = parse_languages(os.getenv("TRANSLATION_LANGUAGES", "en,zh-tw,zh-cn,ko"))
+
+def get_language(code: str) -> Language:
+    """言語コードから言語を取得する (登録されていない場合は KeyError)"""
+    for language in [SOURCE_LANGUAGE, *TRANSLATION_LANGUAGES]:
+        if language.code == code:
+            return language
+    raise KeyError(code)
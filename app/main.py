@@ -1,23 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from .database import engine, Base
-from google import genai
-import os
-from dotenv import load_dotenv
+from .database import engine
+from . import migrations
+from .metrics import MetricsMiddleware
+from .services import image_service, job_service
+from .config import get_settings
 
-load_dotenv()
+# 起動時のスキーマの扱い (migrate / check、app/config.py を参照)
+DB_SCHEMA_MODE = get_settings().db_schema_mode
 
 # アプリケーションのライフサイクル管理
 # 起動時と終了時の処理を定義します
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 起動時の処理: データベースのテーブルを自動作成
-    # (本番環境ではマイグレーションツールなどを使うことが推奨されますが、開発用としてシンプルに実装)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # 起動時の処理: データベースのスキーマを確認 (migrateモードでは未適用のマイグレーションを適用)
+    await migrations.prepare_schema(engine, DB_SCHEMA_MODE)
+    # 記事生成ジョブのワーカーを起動
+    await job_service.start_workers()
     yield
     # 終了時の処理:
+    await job_service.stop_workers()
+    image_service.shutdown()
     await engine.dispose()
 
 app = FastAPI(
@@ -40,14 +44,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # ページネーションのカーソルをフロントエンドから読めるようにする
 )
 
-from fastapi.staticfiles import StaticFiles
-from app.routers import shops, posts, chat, auth
+# リクエストごとのレイテンシ・SQL実行回数を記録する (/metrics で公開)
+app.add_middleware(MetricsMiddleware)
+
+from app.static_files import ContentAddressedStaticFiles
+from app.routers import shops, posts, chat, auth, metrics as metrics_router
 
 # 静的ファイルの配信設定
 # 投稿された画像を /static/... でアクセスできるようにします
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# (内容のハッシュ値をファイル名にした画像は長期キャッシュ用のヘッダー付きで配信)
+app.mount("/static", ContentAddressedStaticFiles(directory="static"), name="static")
 
 # ルーターの登録
 # 各機能のAPIエンドポイントをアプリケーションに追加します
@@ -55,6 +64,7 @@ app.include_router(auth.router)
 app.include_router(shops.router)
 app.include_router(posts.router)
 app.include_router(chat.router)
+app.include_router(metrics_router.router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,357 @@
+"""
+アプリケーションのメトリクス (Prometheusのテキスト形式で /metrics に公開)
+
+- リクエストごとのレイテンシ (ルート・メソッド・ステータス別のヒストグラム)
+- SQLの実行回数・実行時間 (SQLAlchemyのイベントフックで計測)
+- Gemini呼び出しのレイテンシ・エラー数・プロンプトと応答のサイズ
+- 各種キャッシュやキューの状態 (register_gauge で登録した関数の値)
+
+SLOW_REQUEST_MS を設定すると、それより遅いリクエストをSQLの内訳付きでログに出力します。
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 遅いリクエストとしてログに出すしきい値 (ミリ秒)。0の場合は出力しない
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# 遅いリクエストのログに載せるSQLの種類数 (合計時間の長い順)
+SLOW_REQUEST_TOP_QUERIES = int(os.getenv("SLOW_REQUEST_TOP_QUERIES", "5"))
+
+# 秒単位のヒストグラムの区切り
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# バイト数のヒストグラムの区切り
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelValues = tuple[str, ...]
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # アプリ内の更新はすべてイベントループのスレッドで行われるが、instrument_engine は同期エンジンにも登録でき、
+        # スレッドプールなど別のスレッドから更新される可能性があるため、更新と収集はロックで守る (競合しなければコストは小さい)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+class Counter(_Metric):
+    """増える一方の値 (回数など)"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+class Histogram(_Metric):
+    """値の分布 (レイテンシやサイズ)"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [区切りごとの件数..., +Infの件数], 合計, 件数
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge(_Metric):
+    """その時点の値 (キャッシュ件数・キューの長さなど)。収集時に関数を呼び出して値を取得する"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], Union[float, dict[LabelValues, float]]], labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def collect(self) -> list[str]:
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"Metrics Error ({self.name}): {e}")
+            return []
+        values = value if isinstance(value, dict) else {(): value}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in sorted(values.items())
+        ]
+
+REGISTRY: list[_Metric] = []
+
+def register_gauge(name: str, documentation: str, func: Callable, labelnames: tuple[str, ...] = ()) -> Gauge:
+    """収集時に func() の値を返すゲージを登録する (同じ名前なら置き換える)"""
+    for metric in list(REGISTRY):
+        if metric.name == name:
+            REGISTRY.remove(metric)
+    return Gauge(name, documentation, func, labelnames)
+
+def render() -> str:
+    """全メトリクスをPrometheusのテキスト形式で返す"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+# --- メトリクスの定義 ---
+
+http_requests = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+)
+http_requests_in_progress = 0
+db_queries = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by statement type", ("operation",),
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "Number of SQL statements executed per HTTP request", ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+gemini_calls = Histogram(
+    "gemini_request_duration_seconds", "Gemini API call latency by operation", ("operation",),
+)
+gemini_errors = Counter(
+    "gemini_request_errors_total", "Gemini API calls that raised an error", ("operation",),
+)
+gemini_prompt_bytes = Histogram(
+    "gemini_prompt_bytes", "Size of the prompt sent to Gemini (text and inline data)", ("operation",),
+    buckets=SIZE_BUCKETS,
+)
+gemini_response_bytes = Histogram(
+    "gemini_response_bytes", "Size of the text returned by Gemini", ("operation",),
+    buckets=SIZE_BUCKETS,
+)
+slow_requests = Counter(
+    "http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS", ("route",),
+)
+register_gauge("http_requests_in_progress", "HTTP requests currently being processed", lambda: http_requests_in_progress)
+
+# --- リクエスト単位の集計 ---
+
+@dataclass
+class RequestStats:
+    """1リクエストの中で実行されたSQL・Gemini呼び出しの集計 (遅いリクエストのログ用)"""
+    db_count: int = 0
+    db_seconds: float = 0.0
+    gemini_count: int = 0
+    gemini_seconds: float = 0.0
+    # SQL文 (先頭部分) -> [回数, 合計秒]
+    queries: dict[str, list] = field(default_factory=dict)
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _statement_summary(statement: str) -> str:
+    """ログ用にSQL文を1行にまとめ、長いものは切り詰める"""
+    summary = _WHITESPACE_RE.sub(" ", statement).strip()
+    return summary if len(summary) <= 160 else summary[:157] + "..."
+
+# --- SQLAlchemyのイベントフック ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    db_queries.observe(elapsed, operation=operation)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_seconds += elapsed
+        entry = stats.queries.setdefault(_statement_summary(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+def _handle_error(exception_context):
+    # エラーになったSQLの開始時刻を取り除く
+    started = exception_context.connection.info.get("query_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine: Engine):
+    """SQLAlchemyのエンジンにSQL計測用のフックを登録する (AsyncEngineの場合は engine.sync_engine を渡す)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+# --- Gemini呼び出しの計測 ---
+
+@dataclass
+class GeminiCall:
+    """計測中のGemini呼び出し (応答サイズは呼び出し側で設定する)"""
+    operation: str
+    response_bytes: int = 0
+
+def prompt_size(contents) -> int:
+    """Geminiに送るcontents (types.Content のリスト) のおおよそのバイト数"""
+    size = 0
+    for content in contents or []:
+        for part in getattr(content, "parts", None) or []:
+            if getattr(part, "text", None):
+                size += len(part.text.encode("utf-8"))
+            inline_data = getattr(part, "inline_data", None)
+            if inline_data is not None and inline_data.data:
+                size += len(inline_data.data)
+    return size
+
+@contextmanager
+def track_gemini(operation: str, contents=None) -> Iterator[GeminiCall]:
+    """
+    Gemini呼び出しを計測する
+    with track_gemini("chat", contents) as call:
+        response = client.models.generate_content(...)
+        call.response_bytes = len(response.text.encode("utf-8"))
+    """
+    call = GeminiCall(operation)
+    gemini_prompt_bytes.observe(prompt_size(contents), operation=operation)
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        gemini_errors.inc(operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        gemini_calls.observe(elapsed, operation=operation)
+        if call.response_bytes:
+            gemini_response_bytes.observe(call.response_bytes, operation=operation)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.gemini_count += 1
+            stats.gemini_seconds += elapsed
+
+# --- リクエストの計測 (ASGIミドルウェア) ---
+
+def _route_label(scope) -> str:
+    """ルートのパステンプレート (例: /posts/jobs/{job_id})。IDごとにラベルが増えないようにする"""
+    path = getattr(scope.get("route"), "path", None)
+    if path is None:
+        return "<static>" if scope.get("path", "").startswith("/static/") else "<unmatched>"
+    return path
+
+def _log_slow_request(method: str, route: str, path: str, status: int, elapsed: float, stats: RequestStats):
+    slow_requests.inc(route=route)
+    lines = [
+        f"Slow request: {method} {path} (route {route}) -> {status} in {elapsed * 1000:.0f}ms; "
+        f"db {stats.db_count} queries / {stats.db_seconds * 1000:.0f}ms, "
+        f"gemini {stats.gemini_count} calls / {stats.gemini_seconds * 1000:.0f}ms"
+    ]
+    top = sorted(stats.queries.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_REQUEST_TOP_QUERIES]
+    for statement, (count, seconds) in top:
+        lines.append(f"    {count}x {seconds * 1000:.1f}ms  {statement}")
+    print("\n".join(lines))
+
+class MetricsMiddleware:
+    """
+    リクエストのレイテンシとSQL実行回数を記録するASGIミドルウェア
+    ストリーミング応答 (SSE) は最後まで送り終えた時点までを計測します
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global http_requests_in_progress
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress -= 1
+            _request_stats.reset(token)
+            # ルーティング後の scope にはマッチしたルートが入っている
+            route = _route_label(scope)
+            http_requests.observe(elapsed, method=scope["method"], route=route, status=status)
+            db_queries_per_request.observe(stats.db_count, route=route)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope["method"], route, scope.get("path", ""), status, elapsed, stats)
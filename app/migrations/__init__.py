@@ -0,0 +1,134 @@
+"""
+データベースのマイグレーション (バージョン管理されたスキーマ変更)
+
+各マイグレーションは vNNN_*.py に upgrade(conn) として定義し、MIGRATIONS に追加します。
+適用済みのバージョンは schema_migrations テーブルに記録され、未適用のものだけが順に実行されます。
+どのマイグレーションも「既にあれば何もしない」ように書いてあるため、
+以前の create_all で作られたDBにもそのまま適用できます。
+
+実行方法 (プロジェクトルートで):
+    python -m app.migrations upgrade  # 未適用のマイグレーションを適用
+    python -m app.migrations status   # 現在のバージョンとモデル定義との差分を表示
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.migrations import (
+    v001_initial,
+    v002_images_and_translation_cache,
+    v003_query_indexes,
+    v004_full_text_search,
+    v005_shop_directory_indexes,
+    v006_post_status,
+)
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+MIGRATIONS = [
+    Migration(1, "initial tables", v001_initial.upgrade),
+    Migration(2, "posts.image_variants and translation_cache", v002_images_and_translation_cache.upgrade),
+    Migration(3, "indexes for feed and translation queries", v003_query_indexes.upgrade),
+    Migration(4, "full-text search indexes for posts and translations", v004_full_text_search.upgrade),
+    Migration(5, "indexes for the shop directory", v005_shop_directory_indexes.upgrade),
+    Migration(6, "posts.status for drafts awaiting AI generation", v006_post_status.upgrade),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# 起動時のスキーマの扱い (DB_SCHEMA_MODE)
+# migrate: 未適用のマイグレーションを適用する (最新ならバージョンを確認するだけでDDLは実行しない)
+# check:   バージョンを確認するだけで、古ければ起動を止める (本番の複数ワーカー向け)
+SCHEMA_MODES = ("migrate", "check")
+
+_version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class SchemaOutOfDate(RuntimeError):
+    """DBのスキーマが最新のマイグレーションより古い場合の例外"""
+
+def _current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return 0
+    versions = conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+async def current_version(engine: AsyncEngine) -> int:
+    """適用済みの最新バージョン (未管理のDBは0)"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_current_version)
+
+async def check(engine: AsyncEngine) -> int:
+    """スキーマが最新か確認する (DDLは実行しない)。古い場合は SchemaOutOfDate"""
+    version = await current_version(engine)
+    if version < LATEST_VERSION:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, but the app needs {LATEST_VERSION}. "
+            "Run `python -m app.migrations upgrade`."
+        )
+    return version
+
+async def upgrade(engine: AsyncEngine) -> list[Migration]:
+    """未適用のマイグレーションを順に適用し、適用したものを返す"""
+    async with engine.begin() as conn:
+        await conn.run_sync(_version_metadata.create_all)
+        version = await conn.run_sync(_current_version)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # マイグレーションごとにトランザクションを分け、途中で失敗しても適用済みの分は記録に残す
+        async with engine.begin() as conn:
+            await conn.run_sync(migration.upgrade)
+            await conn.execute(schema_migrations.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.datetime.utcnow(),
+            ))
+        print(f"Applied migration {migration.version}: {migration.description}")
+        applied.append(migration)
+    return applied
+
+async def prepare_schema(engine: AsyncEngine, mode: str):
+    """アプリ起動時に DB_SCHEMA_MODE に従ってスキーマを準備する"""
+    if mode == "migrate":
+        await upgrade(engine)
+    elif mode == "check":
+        await check(engine)
+    else:
+        raise ValueError(f"DB_SCHEMA_MODE must be one of {SCHEMA_MODES}, got '{mode}'")
+
+def _model_drift(conn: Connection) -> list[str]:
+    """モデル定義 (app/models.py) にあってDBにないテーブル・カラム・インデックスを列挙する"""
+    from app.database import Base
+    import app.models # noqa: F401 (モデルをBase.metadataに登録する)
+
+    inspector = inspect(conn)
+    drift = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            drift.append(f"missing table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        drift.extend(f"missing column {table.name}.{column.name}" for column in table.columns if column.name not in columns)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        drift.extend(f"missing index {index.name}" for index in table.indexes if index.name not in indexes)
+    return drift
+
+async def model_drift(engine: AsyncEngine) -> list[str]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(_model_drift)
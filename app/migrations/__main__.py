@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+
+from app.database import engine
+from app import migrations
+
+async def run(command: str):
+    try:
+        if command == "upgrade":
+            applied = await migrations.upgrade(engine)
+            if not applied:
+                print("Already up to date")
+        version = await migrations.current_version(engine)
+        print(f"Schema version: {version} (latest: {migrations.LATEST_VERSION})")
+        if command == "status":
+            for line in await migrations.model_drift(engine):
+                print(f"  drift: {line}")
+    finally:
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=migrations.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "status"])
+    asyncio.run(run(parser.parse_args().command))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+マイグレーションで使うカラムの型
+app.models の定義をimportすると、モデルの変更で過去のマイグレーションの内容が変わってしまう
+(また app.database の読み込みでエンジンが作られる) ため、ここに作成時点の定義を固定して持ちます。
+モデル側の型を変える場合も、この内容は変えずに新しいマイグレーションで変更してください。
+"""
+from sqlalchemy import TIMESTAMP
+from sqlalchemy.dialects import sqlite
+
+# 日時カラムの型 (v001 / v002 作成時点の app.models.Timestamp と同じ)
+Timestamp = TIMESTAMP().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
@@ -0,0 +1,44 @@
+"""
+v001: 最初のテーブル (店舗・記事・翻訳・ユーザー)
+モデル定義が変わってもこの内容は変えないでください (変更は新しいマイグレーションで行います)
+"""
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table, Text, func
+from sqlalchemy.engine import Connection
+
+from app.migrations.types import Timestamp
+
+def upgrade(conn: Connection):
+    metadata = MetaData()
+    Table(
+        "shops", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String(255), nullable=False),
+        Column("description", Text, nullable=True),
+        Column("location", String(255), nullable=True),
+        Column("category", String(100), nullable=True),
+        Column("map_url", String(500), nullable=True),
+        Column("reservation_url", String(500), nullable=True),
+    )
+    Table(
+        "posts", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("shop_id", Integer, ForeignKey("shops.id"), nullable=False),
+        Column("original_text", Text, nullable=False),
+        Column("image_path", String(255), nullable=True),
+        Column("created_at", Timestamp, server_default=func.now()),
+    )
+    Table(
+        "translations", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+        Column("language", String(10), nullable=False),
+        Column("translated_content", Text, nullable=False),
+    )
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email", String(255), unique=True, index=True, nullable=False),
+        Column("hashed_password", String(255), nullable=False),
+    )
+    # create_all で作られた既存のDBでは、あるテーブルは作らない
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,24 @@
+"""
+v002: 記事の派生画像カラム (posts.image_variants) とAI生成結果のキャッシュテーブル
+"""
+from sqlalchemy import JSON, Column, MetaData, String, Table, Text, func, inspect, text
+from sqlalchemy.engine import Connection
+
+from app.migrations.types import Timestamp
+
+def upgrade(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("posts")}
+    if "image_variants" not in columns:
+        column_type = JSON().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE posts ADD COLUMN image_variants {column_type} NULL"))
+
+    metadata = MetaData()
+    Table(
+        "translation_cache", metadata,
+        Column("cache_key", String(64), primary_key=True),
+        Column("model_name", String(100), nullable=False),
+        Column("result_json", Text, nullable=False),
+        Column("created_at", Timestamp, server_default=func.now()),
+        Column("last_hit_at", Timestamp, server_default=func.now(), index=True),
+    )
+    metadata.create_all(conn, checkfirst=True)
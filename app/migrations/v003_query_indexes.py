@@ -0,0 +1,20 @@
+"""
+v003: 記事一覧・翻訳の取得に使うインデックス
+- posts(created_at, id): 記事一覧 (新しい順) とキーセットページネーション
+- posts(shop_id, created_at): 店舗ごとの最近の記事、店舗削除時の外部キー参照
+- translations(post_id, language): 記事ごとの翻訳の読み込みと言語指定での絞り込み
+"""
+from sqlalchemy import Index, MetaData, Table
+from sqlalchemy.engine import Connection
+
+def upgrade(conn: Connection):
+    metadata = MetaData()
+    posts = Table("posts", metadata, autoload_with=conn)
+    translations = Table("translations", metadata, autoload_with=conn)
+    indexes = [
+        Index("ix_posts_created_at_id", posts.c.created_at, posts.c.id),
+        Index("ix_posts_shop_id_created_at", posts.c.shop_id, posts.c.created_at),
+        Index("ix_translations_post_id_language", translations.c.post_id, translations.c.language),
+    ]
+    for index in indexes:
+        index.create(conn, checkfirst=True)
@@ -0,0 +1,58 @@
+"""
+v004: 記事・翻訳の全文検索インデックス (GET /posts/search)
+- SQLite: FTS5 (trigram トークナイザ) の外部コンテンツテーブル translations_fts / posts_fts と、
+          元のテーブルへの追加・更新・削除を反映するトリガー
+- MySQL:  ngram パーサーの FULLTEXT インデックス (translations.translated_content, posts.original_text)
+trigram / ngram は単語の区切りに依存しないため、日本語・中国語・韓国語の文章も検索できます。
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+# (FTSテーブル, 元のテーブル, 検索対象のカラム)
+SQLITE_FTS_TABLES = [
+    ("translations_fts", "translations", "translated_content"),
+    ("posts_fts", "posts", "original_text"),
+]
+
+MYSQL_FULLTEXT_INDEXES = [
+    ("ft_translations_translated_content", "translations", "translated_content"),
+    ("ft_posts_original_text", "posts", "original_text"),
+]
+
+def _upgrade_sqlite(conn: Connection):
+    for fts, table, column in SQLITE_FTS_TABLES:
+        exists = inspect(conn).has_table(fts)
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column}, content='{table}', content_rowid='id', tokenize='trigram')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        ))
+        if not exists:
+            # 既存の行をインデックスに登録する
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def _upgrade_mysql(conn: Connection):
+    for name, table, column in MYSQL_FULLTEXT_INDEXES:
+        indexes = {index["name"] for index in inspect(conn).get_indexes(table)}
+        if name not in indexes:
+            conn.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({column}) WITH PARSER ngram"))
+
+def upgrade(conn: Connection):
+    if conn.dialect.name == "sqlite":
+        _upgrade_sqlite(conn)
+    elif conn.dialect.name == "mysql":
+        _upgrade_mysql(conn)
+    else:
+        print(f"Full-text search is not supported on {conn.dialect.name}; GET /posts/search will fall back to LIKE")
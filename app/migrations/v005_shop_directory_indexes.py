@@ -0,0 +1,17 @@
+"""
+v005: 店舗ディレクトリ (GET /shops/directory) の絞り込みに使うインデックス
+- shops(category): カテゴリでの絞り込みとカテゴリごとの店舗数の集計
+- shops(name): 店舗名の前方一致 (範囲条件)
+"""
+from sqlalchemy import Index, MetaData, Table
+from sqlalchemy.engine import Connection
+
+def upgrade(conn: Connection):
+    metadata = MetaData()
+    shops = Table("shops", metadata, autoload_with=conn)
+    indexes = [
+        Index("ix_shops_category", shops.c.category),
+        Index("ix_shops_name", shops.c.name),
+    ]
+    for index in indexes:
+        index.create(conn, checkfirst=True)
@@ -0,0 +1,12 @@
+"""
+v006: 記事の公開状態 (posts.status)
+POST /posts?mode=job の下書きは AI生成・翻訳が終わるまで pending とし、一覧・検索・チャットに表示しないようにします。
+既存の記事は published になります。
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+def upgrade(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("posts")}
+    if "status" not in columns:
+        conn.execute(text("ALTER TABLE posts ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT 'published'"))
@@ -1,8 +1,17 @@
-from sqlalchemy import String, Text, ForeignKey, TIMESTAMP, func
+from sqlalchemy import JSON, String, Text, ForeignKey, TIMESTAMP, Index, func
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from .database import Base
 import datetime
 
+# 日時カラムの型
+# SQLiteでは server_default の CURRENT_TIMESTAMP ('YYYY-MM-DD HH:MM:SS') と同じ形式で値をバインドし、
+# 日時の大小比較 (ページネーションのカーソル等) が文字列比較でも正しくなるようにする
+Timestamp = TIMESTAMP().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 class Shop(Base):
     """
     店舗情報を管理するモデル
@@ -10,16 +19,22 @@ class Shop(Base):
     __tablename__ = "shops"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    name: Mapped[str] = mapped_column(String(255), nullable=False) # 店舗名
+    name: Mapped[str] = mapped_column(String(255), nullable=False, index=True) # 店舗名 (前方一致での絞り込みに使う)
     description: Mapped[str] = mapped_column(Text, nullable=True) # 店舗説明
     location: Mapped[str] = mapped_column(String(255), nullable=True) # 場所
-    category: Mapped[str] = mapped_column(String(100), nullable=True) # カテゴリ (例: ラーメン, 雑貨)
+    category: Mapped[str] = mapped_column(String(100), nullable=True, index=True) # カテゴリ (例: ラーメン, 雑貨)
     map_url: Mapped[str] = mapped_column(String(500), nullable=True) # GoogleMapのURL
     reservation_url: Mapped[str] = mapped_column(String(500), nullable=True) # 予約サイトのURL
 
     # リレーション: 店舗に関連する投稿
     posts = relationship("Post", back_populates="shop", cascade="all, delete-orphan")
 
+# 記事の公開状態
+# pending:   AI生成・翻訳を待っている下書き (POST /posts?mode=job)。一覧・検索・チャットには表示しない
+# published: 公開中の記事
+POST_STATUS_PENDING = "pending"
+POST_STATUS_PUBLISHED = "published"
+
 class Post(Base):
     """
     SNS投稿(記事)を管理するモデル
@@ -30,13 +45,25 @@ class Post(Base):
     shop_id: Mapped[int] = mapped_column(ForeignKey("shops.id"), nullable=False) # どの店舗の投稿か
     original_text: Mapped[str] = mapped_column(Text, nullable=False) # 元の投稿文(日本語)
     image_path: Mapped[str] = mapped_column(String(255), nullable=True) # 画像ファイルへのパス
+    image_variants: Mapped[dict] = mapped_column(JSON, nullable=True) # 派生画像のパス {"thumb": {"webp": ..., "jpeg": ...}, "feed": ..., "full": ...}
+    status: Mapped[str] = mapped_column(
+        String(16), nullable=False, default=POST_STATUS_PUBLISHED, server_default=POST_STATUS_PUBLISHED
+    ) # 公開状態 (POST_STATUS_*)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        TIMESTAMP, server_default=func.now()
+        Timestamp, server_default=func.now()
     ) # 作成日時
 
     # リレーション
     shop = relationship("Shop", back_populates="posts")
-    translations = relationship("Translation", back_populates="post", cascade="all, delete-orphan")
+    # 翻訳は登録順 (id順) に読み込む (一覧APIの通常のパスと高速パスで同じ順序にするため)
+    translations = relationship("Translation", back_populates="post", cascade="all, delete-orphan", order_by="Translation.id")
+
+    __table_args__ = (
+        # 記事一覧 (新しい順) のキーセットページネーション用
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        # 店舗ごとの最近の記事の取得用
+        Index("ix_posts_shop_id_created_at", "shop_id", "created_at"),
+    )
 
 class Translation(Base):
     """
@@ -52,6 +79,11 @@ class Translation(Base):
     # リレーション
     post = relationship("Post", back_populates="translations")
 
+    __table_args__ = (
+        # 記事ごとの翻訳の読み込み・言語指定での絞り込み用
+        Index("ix_translations_post_id_language", "post_id", "language"),
+    )
+
 class User(Base):
     """
     管理者ユーザーを管理するモデル
@@ -61,3 +93,20 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
+
+class TranslationCacheEntry(Base):
+    """
+    AI記事生成・翻訳結果のキャッシュ
+    画像・コメント・プロンプト版・モデル名のハッシュをキーにします
+    """
+    __tablename__ = "translation_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True) # SHA-256 (hex)
+    model_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    result_json: Mapped[str] = mapped_column(Text, nullable=False) # AIの生成結果 (JSON文字列)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        Timestamp, server_default=func.now()
+    )
+    last_hit_at: Mapped[datetime.datetime] = mapped_column(
+        Timestamp, server_default=func.now(), index=True
+    ) # 削除順の判定に使う最終利用日時
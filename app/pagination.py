@@ -0,0 +1,31 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+# 次ページのカーソルを返すレスポンスヘッダー
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# 一覧APIで1回に取得できる件数の上限 (limit)
+MAX_PAGE_LIMIT = 1000
+
+class InvalidCursor(ValueError):
+    """カーソル文字列が壊れている場合の例外"""
+
+def encode_cursor(*values: Any) -> str:
+    """
+    キーセットページネーション用のカーソルを作る
+    クライアントには中身を意識させないよう、JSONをURLセーフなbase64にして返します
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """encode_cursor で作ったカーソルを値のリストに戻す"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
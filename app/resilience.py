@@ -0,0 +1,233 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class CircuitOpen(Exception):
+    """サーキットブレーカーが開いている (外部サービスが不調) ため呼び出しを行わなかった場合の例外"""
+
+class CircuitBreaker:
+    """
+    外部サービスの呼び出しで連続して失敗した場合に、しばらく呼び出しを止めて即座に失敗させる仕組み
+    - closed:    通常状態。failure_threshold 回連続で失敗すると open になる
+    - open:      reset_seconds の間は呼び出さずに CircuitOpen を返す
+    - half_open: reset_seconds 経過後、1回だけ試しに呼び出す。成功すれば closed、失敗すれば再び open
+    asyncioの単一スレッド内で使う前提のため、ロックは取っていません
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        # 統計情報
+        self.rejections = 0
+        self.open_count = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """呼び出し前に確認する (呼び出せない場合は CircuitOpen)"""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        self.rejections += 1
+        raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                self.open_count += 1
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self):
+        """成功・失敗のどちらとも数えない結果 (入力エラーなど) の場合に呼び、試行中の状態だけを解除する"""
+        self._trial_in_flight = False
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    リトライまでの待ち時間 (秒)
+    指数バックオフに full jitter (0〜上限の一様乱数) をかけ、同時に失敗したリクエストのリトライが重ならないようにする
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class LatencyTracker:
+    """直近の呼び出し時間を保持し、パーセンタイルを計算する"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+        return ordered[index]
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_after: float, on_hedge: Optional[Callable[[], bool]] = None) -> T:
+    """
+    call() を実行し、hedge_after 秒たっても終わらなければ同じ呼び出しをもう1つ並行して始め、先に成功した方を返す
+    (遅い呼び出しに引きずられる裾のレイテンシを抑えるための「ヘッジリクエスト」)
+    on_hedge() が False を返した場合 (空きがない等) はヘッジせずに最初の呼び出しを待ちます。
+    使われなかった方はキャンセルします。両方失敗した場合は後に失敗した方の例外を送出します。
+    """
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done and (on_hedge is None or on_hedge()):
+            tasks.add(asyncio.ensure_future(call()))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+class Priority(IntEnum):
+    """外部APIの呼び出しの優先度 (小さいほど先に実行する)"""
+    INTERACTIVE = 0 # 観光客のチャットなど、人が応答を待っているもの
+    STANDARD = 1 # 店主の記事作成など
+    BATCH = 2 # バックフィルなどのまとめて行う処理
+
+class AdmissionRejected(Exception):
+    """待ち行列が満杯、または待ち時間が期限を超えたため呼び出しを行わなかった場合の例外"""
+
+class AdmissionController:
+    """
+    外部APIの呼び出しを、レート制限 (トークンバケット) と同時実行数の上限の範囲に収める
+    - rate_per_second: 平均の呼び出し回数/秒 (APIのクォータに合わせる)
+    - burst: 一度に連続して呼び出せる回数 (トークンバケットの容量)
+    - max_concurrency: 同時に実行中にできる呼び出し数
+    空きがない場合は優先度順 (同じ優先度なら到着順) の待ち行列に入ります。
+    asyncioの単一スレッド内で使う前提のため、ロックは取っていません
+    """
+
+    def __init__(self, rate_per_second: float, burst: int, max_concurrency: int, max_queue: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self._refilled_at = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate_per_second)
+        self._refilled_at = now
+
+    def _can_admit(self) -> bool:
+        self._refill()
+        return self.in_flight < self.max_concurrency and self.tokens >= 1
+
+    def _admit(self):
+        self.tokens -= 1
+        self.in_flight += 1
+
+    def available_tokens(self) -> float:
+        """今使えるトークン数 (監視用。前回の補充からの経過時間分を補充してから返す)"""
+        self._refill()
+        return self.tokens
+
+    def queue_depth(self, priority: Optional[Priority] = None) -> int:
+        """待ち行列の長さ (priority を指定するとその優先度だけ)"""
+        return sum(
+            1 for waiter_priority, _, future in self._waiters
+            if not future.done() and (priority is None or waiter_priority == priority)
+        )
+
+    def try_acquire(self) -> bool:
+        """待たずに実行できる場合だけ枠を確保する (待っている呼び出しがある場合は確保しない)"""
+        if self.queue_depth() == 0 and self._can_admit():
+            self._admit()
+            return True
+        return False
+
+    async def acquire(self, priority: Priority, timeout: Optional[float] = None) -> float:
+        """
+        実行枠を確保する (終わったら必ず release を呼ぶ)。戻り値は待った時間 (秒)
+        timeout 秒以内に確保できない場合や待ち行列が満杯の場合は AdmissionRejected
+        """
+        if self.try_acquire():
+            return 0.0
+        if self.queue_depth() >= self.max_queue:
+            raise AdmissionRejected("Too many requests are waiting")
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release() # 枠を確保した直後にタイムアウト・キャンセルされた場合は返却する
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected(f"Waited more than {timeout:.1f}s for capacity") from e
+            raise
+        return time.monotonic() - started
+
+    def release(self):
+        """acquire で確保した枠を返却する"""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """空きがあれば、優先度の高い待ちから順に枠を割り当てる"""
+        while self._waiters and self._can_admit():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue # タイムアウト・キャンセル済み
+            self._admit()
+            future.set_result(None)
+        # トークン不足で待っている場合は、トークンが貯まる頃にもう一度割り当てる
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters and self.in_flight < self.max_concurrency and self._timer is None:
+            delay = max((1 - self.tokens) / self.rate_per_second, 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
@@ -1,12 +1,11 @@
-import os
-
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi.security import OAuth2PasswordRequestForm
+from app.config import get_settings
 from app.database import get_db
 from app.models import User
-from app.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from app.auth import get_password_hash_async, verify_password_async, create_access_token, get_current_user, invalidate_user
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -31,7 +30,7 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     新規ユーザー登録
     """
     # 招待コードを取得
-    correct_invite_code = os.getenv("INVITE_CODE")
+    correct_invite_code = get_settings().invite_code
     # 環境変数が設定されていない場合や、コードが間違っている場合はエラー
     # (念のため correct_invite_code が None の場合もエラー扱いにして安全側に倒します)
     if not correct_invite_code or user.invite_code != correct_invite_code:
@@ -50,11 +49,12 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
         )
     
     # ユーザー作成
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
     await db.commit()
     await db.refresh(new_user)
+    invalidate_user(new_user.email) # 同じemailの古いキャッシュが残らないようにする
     
     # トークン発行してログイン状態にする
     access_token = create_access_token(data={"sub": new_user.email})
@@ -69,7 +69,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     result = await db.execute(select(User).filter(User.email == form_data.username)) # OAuth2Formのusernameフィールドにemailが入る
     user = result.scalars().first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
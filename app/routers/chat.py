@@ -1,20 +1,119 @@
-from fastapi import APIRouter, Depends
+import json
+import time
+from contextlib import aclosing
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.schemas.chat import ChatRequest, ChatResponse
-from app.services import chat_service
+from app.schemas.chat import ChatRequest, ChatResponse, ChatContextStatus, ChatHistoryItem
+from app.services import chat_service, chat_session_service, shop_context_service
+from app.services.chat_session_service import ChatSession
 
 router = APIRouter(
     prefix="/chat",
     tags=["chat"],
 )
 
+def _open_session(request: ChatRequest) -> tuple[Optional[ChatSession], list[ChatHistoryItem], str]:
+    """
+    会話履歴と要約を取得する (セッション, 履歴, 要約)
+    session_id が指定された場合と、履歴のない最初の質問の場合はサーバー側のセッションを使います。
+    履歴だけを送ってくる従来のクライアントはセッションを使いません。
+    """
+    if request.session_id or not request.history:
+        session = chat_session_service.get_or_create(request.session_id, request.history)
+        # 要約中に履歴が変わっても影響しないようにコピーを使う
+        return session, list(session.turns), session.summary
+    return None, request.history, ""
+
 @router.post("/", response_model=ChatResponse)
 async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
     """
     AIチャットボットAPI
     ユーザーの質問を受け取り、店舗情報を元に回答を生成します。
+    レスポンスの session_id を次の質問で送ると、会話の続きとして扱います。
+    セッションが見つからない場合 (別のワーカー・再起動・期限切れ) に備えて、直近の history も一緒に送ってください。
+    """
+    session, history, summary = _open_session(request)
+    response_text = await chat_service.generate_chat_response(db, request.message, history, summary)
+    if session is None:
+        return ChatResponse(response=response_text)
+    if response_text != chat_service.FALLBACK_RESPONSE:
+        chat_session_service.record_turn(session, request.message, response_text)
+    return ChatResponse(response=response_text, session_id=session.id)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no", # nginx等のプロキシでバッファリングさせない
+}
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Server-Sent Events 形式の1メッセージを作る"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, http_request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    AIチャットボットAPI (ストリーミング版)
+    回答を Server-Sent Events で少しずつ返します。
+    - data: {"text": "..."}                       … 回答の断片
+    - event: done  / data: {"ttft_ms", "total_ms", "cached", "session_id"} … 完了 (最初の断片までの時間と全体の時間)
+    - event: error / data: {"error": "..."}        … Gemini呼び出しの失敗
+    クライアントが切断した場合はGeminiへの通信も中断します。
+    """
+    started = time.perf_counter()
+    session, history, summary = _open_session(request)
+    session_id = session.id if session else None
+
+    # よくある質問はキャッシュした回答を1回で返す
+    cache_key = chat_service.answer_cache_key(request.message, history, summary)
+    cached = chat_service.answer_cache.get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        if session is not None:
+            chat_session_service.record_turn(session, request.message, cached)
+        async def cached_stream():
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            yield _sse({"text": cached})
+            yield _sse({"ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "cached": True, "session_id": session_id}, event="done")
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    # DBを使う処理はレスポンス開始前に済ませておく
+    contents, config = await chat_service.prepare_chat(db, request.message, history, summary)
+
+    async def event_stream():
+        ttft_ms = None
+        parts = []
+        try:
+            async with aclosing(chat_service.stream_chat_response(contents, config)) as chunks:
+                async for text in chunks:
+                    if await http_request.is_disconnected():
+                        return # aclosing によりGeminiへのストリームも閉じられる
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                    parts.append(text)
+                    yield _sse({"text": text})
+        except Exception as e:
+            print(f"Chat Stream Error: {e}")
+            yield _sse({"error": chat_service.FALLBACK_RESPONSE}, event="error")
+            return
+        # 最後まで受信できた回答だけをキャッシュし、会話に追加する
+        answer = "".join(parts)
+        if cache_key is not None and parts:
+            chat_service.answer_cache.set(cache_key, answer)
+        if session is not None and parts:
+            chat_session_service.record_turn(session, request.message, answer)
+        total_ms = (time.perf_counter() - started) * 1000
+        yield _sse({"ttft_ms": ttft_ms, "total_ms": total_ms, "cached": False, "session_id": session_id}, event="done")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/context", response_model=ChatContextStatus)
+async def read_chat_context_status():
+    """
+    チャット用店舗情報スナップショットの世代と作成時間を取得する (監視用)
     """
-    response_text = await chat_service.generate_chat_response(db, request.message, request.history)
-    return ChatResponse(response=response_text)
+    return shop_context_service.status()
@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app import auth, metrics
+from app.services import chat_service, chat_session_service, feed_cache_service, job_service, shop_context_service, translation_cache_service
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheusのテキスト形式のContent-Type
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _cache_stats() -> dict[str, dict]:
+    return {
+        "feed": feed_cache_service.stats(),
+        "chat_answer": chat_service.answer_cache.stats(),
+        "auth_user": auth.user_cache_stats(),
+        "chat_session": chat_session_service.stats(),
+    }
+
+def _cache_values(key: str) -> dict[tuple[str, ...], float]:
+    return {(name,): stats[key] for name, stats in _cache_stats().items()}
+
+# 各サービスが持っている統計情報を、/metrics の収集時に読み取るゲージとして登録する
+metrics.register_gauge("app_cache_hits", "Cache hits since process start", lambda: _cache_values("hits"), ("cache",))
+metrics.register_gauge("app_cache_misses", "Cache misses since process start", lambda: _cache_values("misses"), ("cache",))
+metrics.register_gauge("app_cache_entries", "Entries currently held in the cache", lambda: _cache_values("size"), ("cache",))
+metrics.register_gauge(
+    "translation_cache_lookups", "AI result cache lookups by outcome since process start",
+    lambda: {(outcome,): count for outcome, count in translation_cache_service.stats_counters.items()},
+    ("outcome",),
+)
+metrics.register_gauge("post_job_queue_depth", "Post generation jobs waiting in the queue", job_service.queue_depth)
+metrics.register_gauge("bcrypt_in_flight", "Password hashes running on the bcrypt executor", lambda: auth.bcrypt_stats()["in_flight"])
+metrics.register_gauge("bcrypt_queue_depth", "Password hashes waiting for a bcrypt thread", lambda: auth.bcrypt_stats()["queue_depth"])
+metrics.register_gauge("shop_context_rebuilds", "Shop context snapshot rebuilds since process start", lambda: shop_context_service.rebuild_count)
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    メトリクスをPrometheusのテキスト形式で返す (監視用)
+    """
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
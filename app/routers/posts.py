@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional
 
+from app import serialization
 from app.database import get_db
-from app.schemas.post import PostResponse
-from app.services import post_service
+from app.pagination import MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, InvalidCursor
+from app.schemas.post import PostResponse, PostJobResponse, PostSearchResult
+from app.services import feed_cache_service, image_service, post_service, job_service, search_service
 from app.auth import get_current_user
 from app.models import User
 
@@ -13,27 +16,121 @@ router = APIRouter(
     tags=["posts"],
 )
 
-@router.post("/", response_model=PostResponse)
+# 一覧APIはシリアライズ済みのレスポンスを直接返すため、ヘッダーと304応答をOpenAPIに明示する
+_FEED_HEADERS = {
+    "ETag": {"description": "ページ内容のETag (If-None-Match に渡すと変更がなければ304)", "schema": {"type": "string"}},
+    NEXT_CURSOR_HEADER: {"description": "次ページのカーソル (最後のページでは省略)", "schema": {"type": "string"}},
+    "X-Cache": {"description": "サーバー側のキャッシュの結果", "schema": {"type": "string", "enum": ["HIT", "MISS"]}},
+}
+_FEED_RESPONSES = {
+    200: {"headers": _FEED_HEADERS},
+    304: {"description": "Not Modified (If-None-Match がETagと一致)", "headers": _FEED_HEADERS},
+}
+
+def _job_response(job: job_service.PostJob) -> PostJobResponse:
+    return PostJobResponse(
+        job_id=job.id,
+        status=job.status,
+        post_id=job.post_id,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+@router.post("/", response_model=PostResponse, responses={202: {"model": PostJobResponse}})
 async def create_post(
     shop_id: int = Form(...), # フォームデータとしてshop_idを受け取る
     text: str = Form(...),    # フォームデータとしてテキストを受け取る
     image: UploadFile = File(...), # ファイルアップロードとして画像を受け取る
+    mode: Literal["sync", "job"] = "sync", # job: AI生成をバックグラウンドで行い、すぐに202を返す
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     AIを使った記事作成API (ログイン必須)
     写真とコメントを受け取り、AI生成・翻訳を行った上で投稿を作成します。
+    mode=job の場合は下書きを保存してジョブIDを返し、進捗は GET /posts/jobs/{job_id} で確認します。
     """
+    if mode == "job":
+        try:
+            job = await post_service.create_post_job(db, shop_id, text, image)
+        except job_service.JobQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except image_service.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except image_service.InvalidImage:
+            raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+        return JSONResponse(status_code=202, content=_job_response(job).model_dump(mode="json"))
+
     try:
         return await post_service.create_post_with_ai(db, shop_id, text, image)
+    except image_service.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_service.InvalidImage:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
     except Exception as e:
         # 何らかのエラーが発生した場合は500エラーを返す
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[PostResponse])
-async def read_posts(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+@router.get("/jobs/{job_id}", response_model=PostJobResponse)
+async def read_post_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    記事生成ジョブの状態を取得する (ログイン必須)
+    """
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@router.get("/search", response_model=List[PostSearchResult])
+async def search_posts(
+    q: str,
+    lang: Optional[str] = None, # 指定するとその言語の翻訳 (jaの場合は元の投稿文も) だけを検索する
+    limit: int = 20,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    記事の全文検索
+    投稿文と全言語の翻訳から q (空白区切りの語をすべて含むもの) を検索し、関連度順に返します。
+    日本語・中国語・韓国語のように単語を空白で区切らない言語も検索できます。
+    """
+    try:
+        return await search_service.search_posts(db, q, lang=lang, limit=limit)
+    except search_service.InvalidSearchQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/", response_model=List[PostResponse], responses=_FEED_RESPONSES)
+async def read_posts(
+    request: Request,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    lang: Optional[str] = None, # 例: "en", "zh-tw"。指定するとその言語の翻訳だけを返す
+    db: AsyncSession = Depends(get_db),
+):
     """
     投稿記事の一覧を取得する
+    次ページのカーソルは X-Next-Cursor ヘッダーで返します。
+    無限スクロールでは skip ではなく cursor を渡すと、何ページ目でも同じ速さで取得できます。
+    lang を指定すると translations にはその言語 (なければ zh-tw → zh-cn → en のような代替言語) の1件だけが入ります。
+    先頭の数ページはシリアライズ済みのレスポンスをキャッシュし、ETag (If-None-Match) による304応答にも対応します。
     """
-    return await post_service.get_posts(db, skip=skip, limit=limit)
+    key = feed_cache_service.cache_key(skip, limit, cursor, lang)
+    page = feed_cache_service.get(key) if key is not None else None
+    if page is not None:
+        return feed_cache_service.respond(request, page, "HIT")
+
+    generation = feed_cache_service.current_generation()
+    try:
+        if serialization.FAST_LIST_SERIALIZATION:
+            # カラムの値だけを取得し、モデルの検証を省略して直接JSONにする
+            rows, next_cursor = await post_service.get_post_rows(db, skip=skip, limit=limit, cursor=cursor, lang=lang)
+            page = feed_cache_service.make_page(serialization.dumps(rows), next_cursor)
+        else:
+            posts, next_cursor = await post_service.get_posts(db, skip=skip, limit=limit, cursor=cursor, lang=lang)
+            page = feed_cache_service.build_page(posts, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if key is not None:
+        feed_cache_service.put(key, page, generation)
+    return feed_cache_service.respond(request, page, "MISS")
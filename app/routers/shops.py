@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional
 
+from app import serialization
 from app.database import get_db
-from app.schemas.shop import ShopCreate, ShopResponse, ShopUpdate
-from app.services import shop_service
+from app.pagination import MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, InvalidCursor
+from app.schemas.shop import CategoryFacet, ShopCreate, ShopDirectoryResponse, ShopImportResult, ShopResponse, ShopUpdate
+from app.services import shop_import_service, shop_service
 from app.auth import get_current_user
 from app.models import User
 
@@ -22,14 +24,89 @@ async def create_shop(shop: ShopCreate, db: AsyncSession = Depends(get_db), curr
     """
     return await shop_service.create_shop(db, shop)
 
+@router.post("/import", response_model=ShopImportResult)
+async def import_shops(
+    request: Request,
+    format: Optional[Literal["csv", "jsonl"]] = None, # 省略時は Content-Type (text/csv, application/x-ndjson) から判定
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    店舗を一括登録する (ログイン必須)
+    リクエストボディにCSV (1行目はヘッダー) またはJSON Lines をそのまま送ります。
+    店舗名が同じ店舗が既にあれば更新、なければ新規作成します。
+    不正な行は取り込まずに、行番号とエラー内容を errors に返します。
+    """
+    fmt = format or shop_import_service.detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Specify format=csv|jsonl or a text/csv / application/x-ndjson Content-Type")
+    try:
+        return await shop_import_service.import_shops(db, request.stream(), fmt)
+    except shop_import_service.InvalidImportFile as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except shop_import_service.ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 @router.get("/", response_model=List[ShopResponse])
-async def read_shops(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_shops(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None, # カテゴリ (完全一致)
+    location: Optional[str] = None, # 場所 (部分一致)
+    name_prefix: Optional[str] = None, # 店舗名 (前方一致)
+    db: AsyncSession = Depends(get_db),
+):
     """
-    店舗一覧を取得する
+    店舗一覧を取得する (ID順)
+    次ページのカーソルは X-Next-Cursor ヘッダーで返します。
     """
-    shops = await shop_service.get_shops(db, skip=skip, limit=limit)
+    filters = dict(category=category, location=location, name_prefix=name_prefix)
+    try:
+        if serialization.FAST_LIST_SERIALIZATION:
+            # カラムの値だけを取得し、response_model の検証を省略して直接JSONにする
+            rows, next_cursor = await shop_service.get_shop_rows(db, skip=skip, limit=limit, cursor=cursor, **filters)
+            headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+            return Response(content=serialization.dumps(rows), media_type="application/json", headers=headers)
+        shops, next_cursor = await shop_service.get_shops(db, skip=skip, limit=limit, cursor=cursor, **filters)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return shops
 
+@router.get("/directory", response_model=ShopDirectoryResponse)
+async def read_shop_directory(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    店舗ディレクトリ・地図ページ用の店舗一覧 (GET /shops/ と同じ絞り込み)
+    絞り込み後の店舗数と、カテゴリごとの店舗数 (カテゴリの絞り込みを除いた条件で数えたもの) も返します。
+    次ページのカーソルは X-Next-Cursor ヘッダーで返します。
+    """
+    try:
+        shops, categories, total, next_cursor = await shop_service.get_shop_directory(
+            db, skip=skip, limit=limit, cursor=cursor, category=category, location=location, name_prefix=name_prefix,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    facets = sorted(categories.items(), key=lambda item: (-item[1], item[0] or ""))
+    return ShopDirectoryResponse(
+        shops=[ShopResponse.model_validate(shop) for shop in shops],
+        total=total,
+        categories=[CategoryFacet(category=name, count=count) for name, count in facets],
+    )
+
 @router.get("/{shop_id}", response_model=ShopResponse)
 async def read_shop(shop_id: int, db: AsyncSession = Depends(get_db)):
     """
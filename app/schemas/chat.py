@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import datetime
 
 class ChatHistoryItem(BaseModel):
     role: str # "user" or "model"
@@ -10,10 +11,26 @@ class ChatRequest(BaseModel):
     チャットリクエストのスキーマ
     """
     message: str # 最新のユーザーメッセージ
+    # サーバー側で会話を保持する場合のセッションID (前回のレスポンスの session_id)
+    # 省略して history も空の場合は新しいセッションを開始します
+    session_id: Optional[str] = None
+    # セッションを使わない場合 (またはセッションが見つからなかった場合に引き継ぐ) 会話履歴
     history: List[ChatHistoryItem] = []
 
 class ChatResponse(BaseModel):
     """
     AIのチャットレスポンスのスキーマ
     """
-    response: str
\ No newline at end of file
+    response: str
+    session_id: Optional[str] = None # 次のリクエストで送るセッションID
+
+class ChatContextStatus(BaseModel):
+    """
+    チャット用店舗情報スナップショットの状態
+    """
+    generation: int # 現在の世代 (店舗が変更されるたびに増える)
+    snapshot_generation: Optional[int] = None # スナップショットを作成した時点の世代
+    built_at: Optional[datetime.datetime] = None # スナップショットの作成日時
+    build_ms: Optional[float] = None # 作成にかかった時間 (ミリ秒)
+    shop_count: int
+    rebuild_count: int # 起動してからの作成回数 (= チャットでDBを読んだ回数)
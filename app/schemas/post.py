@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional
 import datetime
 
 class TranslationResponse(BaseModel):
@@ -31,7 +31,29 @@ class PostResponse(PostBase):
     id: int
     shop_id: int
     image_path: Optional[str] = None # 画像のURLパス
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None # 派生画像のURLパス (サイズ名 -> 形式 -> パス)
     created_at: datetime.datetime # 投稿日時
     translations: List[TranslationResponse] = [] # 翻訳リスト
 
     model_config = ConfigDict(from_attributes=True)
+
+class PostSearchResult(BaseModel):
+    """
+    記事検索 (GET /posts/search) の結果1件
+    """
+    post: PostResponse
+    score: float # 関連度 (大きいほど関連が高い。全文インデックスを使えない短い語だけの検索では0)
+    matched_language: str # 一致した文書の言語 (元の投稿文は "ja")
+    snippet: str # 一致箇所の周辺の抜粋
+
+class PostJobResponse(BaseModel):
+    """
+    記事生成ジョブのレスポンススキーマ
+    status: queued / running / succeeded / failed
+    """
+    job_id: str
+    status: str
+    post_id: int # 下書きとして保存された投稿のID
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
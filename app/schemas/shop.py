@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Literal, Optional
 
 class ShopBase(BaseModel):
     """
@@ -34,3 +34,39 @@ class ShopResponse(ShopBase):
 
     # ORMモデルからPydanticモデルへの変換を有効化
     model_config = ConfigDict(from_attributes=True)
+
+class CategoryFacet(BaseModel):
+    """
+    カテゴリごとの店舗数 (カテゴリ以外の絞り込み条件で数えたもの)
+    """
+    category: Optional[str] = None # カテゴリ未設定の店舗はNone
+    count: int
+
+class ShopDirectoryResponse(BaseModel):
+    """
+    店舗ディレクトリ (絞り込み結果とカテゴリごとの店舗数)
+    """
+    shops: List[ShopResponse]
+    total: int # 絞り込み条件に一致する店舗数 (全ページ合計)
+    categories: List[CategoryFacet] = [] # 店舗数の多い順
+
+class ShopImportError(BaseModel):
+    """
+    一括インポートで取り込めなかった行
+    """
+    row: int # ファイル上の行番号 (CSVはヘッダーが1行目)
+    name: Optional[str] = None
+    error: str
+
+class ShopImportResult(BaseModel):
+    """
+    一括インポートの結果
+    """
+    format: Literal["csv", "jsonl"]
+    total: int # データ行の数
+    inserted: int # 新しく作成した店舗の数
+    updated: int # 更新した既存の店舗の数
+    duplicates: int = 0 # 同じ店舗名の2行目以降の行の数 (前の行に上書きして取り込み、inserted / updated には数えない)
+    failed: int
+    errors: List[ShopImportError] = []
+    errors_truncated: bool = False # エラーが多すぎて一部を省略した場合True
@@ -0,0 +1,22 @@
+import os
+
+import pydantic_core
+
+try:
+    import orjson
+except ImportError: # orjson がない環境では pydantic-core のエンコーダーを使う (出力は同じ)
+    orjson = None
+
+# 一覧API (GET /posts, GET /shops) の高速パスを使うか
+# 有効にすると、ORMのオブジェクトではなくカラムの値だけを取得し、レスポンスのモデル検証を省略して直接JSONにします
+# (レスポンスの内容は通常のパスと同じです)
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "false").lower() in ("1", "true", "yes")
+
+def dumps(value) -> bytes:
+    """
+    dict / list / datetime などをJSONのバイト列にする
+    出力は pydantic (レスポンスモデル) でシリアライズした場合と同じ形式です (UTCの日時は "Z")
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return pydantic_core.to_json(value)
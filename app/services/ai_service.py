@@ -1,73 +1,350 @@
+import asyncio
 import os
-from google import genai
-from google.genai import types
+import sys
+import time
+from contextlib import aclosing
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+import httpx
 import json
-from dotenv import load_dotenv
 
-load_dotenv()
+from app import metrics
+from app.config import get_settings
+from app.languages import TRANSLATION_LANGUAGES, Language
+from app.resilience import (
+    AdmissionController, AdmissionRejected, CircuitBreaker, CircuitOpen, LatencyTracker, Priority, backoff_delay, hedged,
+)
+
+if TYPE_CHECKING:
+    from google.genai import types
 
 # Google Gemini APIの設定
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# google-genai の読み込みには時間がかかるため、SDKとクライアントは最初のAI呼び出しで読み込みます (get_client)
+# (ワーカーの起動を速くするため。起動時の読み込み時間は benchmarks/bench_startup.py で確認できます)
+GEMINI_API_KEY = get_settings().gemini_api_key
+
+# genai.Client (未作成の場合はNone)。ベンチマークなどではスタブに差し替えられます
+client = None
+
+# 使用するAIモデル
+MODEL_NAME = get_settings().gemini_model
+
+# 記事生成プロンプトのバージョン
+# プロンプトやレスポンス形式を変更した場合は番号を上げてください (翻訳キャッシュが無効になります)
+# 翻訳する言語の変更は自動的に反映されます
+PROMPT_VERSION = "1:" + ",".join(lang.code for lang in TRANSLATION_LANGUAGES)
+
+# --- Gemini呼び出しのタイムアウト・リトライ・ヘッジ・サーキットブレーカー ---
+
+# 呼び出し全体の期限 (秒)。リトライを含めてこの時間を超えたら諦める
+GEMINI_CHAT_DEADLINE_SECONDS = float(os.getenv("GEMINI_CHAT_DEADLINE_SECONDS", "20"))
+GEMINI_POST_DEADLINE_SECONDS = float(os.getenv("GEMINI_POST_DEADLINE_SECONDS", "60"))
+# ストリーミングで次のチャンクを待つ最大時間 (秒)
+GEMINI_STREAM_IDLE_SECONDS = float(os.getenv("GEMINI_STREAM_IDLE_SECONDS", "15"))
+# 一時的なエラー (5xx, 429, タイムアウト, 通信エラー) のリトライ回数と待ち時間 (秒)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.5"))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "4"))
+# チャットのヘッジリクエスト: 直近の応答時間のp95を過ぎても返ってこなければ、同じリクエストをもう1つ送る
+GEMINI_HEDGE_CHAT = os.getenv("GEMINI_HEDGE_CHAT", "false").lower() in ("1", "true", "yes")
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+GEMINI_HEDGE_MIN_DELAY_MS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_MS", "500"))
+GEMINI_HEDGE_INITIAL_DELAY_MS = float(os.getenv("GEMINI_HEDGE_INITIAL_DELAY_MS", "3000")) # 計測数が少ない間に使う値
+# サーキットブレーカー: 連続でこの回数失敗したら、一定時間 (秒) Geminiを呼ばずに即座に失敗させる
+GEMINI_CIRCUIT_FAILURES = int(os.getenv("GEMINI_CIRCUIT_FAILURES", "5"))
+GEMINI_CIRCUIT_RESET_SECONDS = float(os.getenv("GEMINI_CIRCUIT_RESET_SECONDS", "30"))
+
+# 流量制御: クォータ (1分あたりの呼び出し回数) と同時実行数の範囲に収め、超えた分は優先度順に待たせる
+# 値はプロセスごとなので、複数ワーカーで動かす場合はクォータをワーカー数で割った値を設定してください
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "600"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "20"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "200"))
+
+circuit_breaker = CircuitBreaker("Gemini", GEMINI_CIRCUIT_FAILURES, GEMINI_CIRCUIT_RESET_SECONDS)
+admission = AdmissionController(GEMINI_RATE_PER_MINUTE / 60, GEMINI_BURST, GEMINI_MAX_CONCURRENCY, GEMINI_MAX_QUEUE)
+# 操作ごとの直近の応答時間 (ヘッジを送るまでの時間の計算に使う)
+_latency: dict[str, LatencyTracker] = {}
+_HEDGE_MIN_SAMPLES = 20
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+gemini_retries = metrics.Counter("gemini_retries_total", "Gemini calls retried after a transient error", ("operation",))
+gemini_hedges = metrics.Counter("gemini_hedged_requests_total", "Hedged (duplicate) Gemini requests sent", ("operation",))
+gemini_circuit_rejections = metrics.Counter("gemini_circuit_rejections_total", "Gemini calls rejected while the circuit was open", ("operation",))
+_CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+# サーキットブレーカーの状態 (circuit_status) を /metrics に公開する (拒否数は gemini_circuit_rejections_total)
+metrics.register_gauge("gemini_circuit_state", "Gemini circuit breaker state (0=closed, 1=half_open, 2=open)", lambda: _CIRCUIT_STATES[circuit_status()["state"]])
+metrics.register_gauge("gemini_circuit_consecutive_failures", "Consecutive Gemini failures counted by the circuit breaker", lambda: circuit_status()["consecutive_failures"])
+metrics.register_gauge("gemini_circuit_opens", "Times the Gemini circuit breaker has opened since process start", lambda: circuit_status()["open_count"])
+gemini_admission_wait = metrics.Histogram(
+    "gemini_admission_wait_seconds", "Time Gemini calls waited for rate limit / concurrency capacity", ("priority",),
+)
+gemini_admission_rejections = metrics.Counter(
+    "gemini_admission_rejections_total", "Gemini calls rejected because the queue was full or the wait exceeded the deadline", ("priority",),
+)
+# 流量制御の状態 (admission_status) を /metrics に公開する
+metrics.register_gauge(
+    "gemini_admission_queue_depth", "Gemini calls waiting for capacity",
+    lambda: {(name,): depth for name, depth in admission_status()["queue_depth"].items()}, ("priority",),
+)
+metrics.register_gauge("gemini_in_flight", "Gemini calls currently in progress", lambda: admission_status()["in_flight"])
+metrics.register_gauge("gemini_admission_tokens", "Gemini rate limit tokens currently available", lambda: admission_status()["tokens"])
 
-# 使用するAIモデル (ユーザー指定: 2.5 flash lite)
-MODEL_NAME = "gemini-2.5-flash-lite"
+def get_client():
+    """Geminiのクライアントを返す (初回の呼び出しでSDKを読み込んで作成する)"""
+    global client
+    if client is None:
+        from google import genai
+        client = genai.Client(api_key=GEMINI_API_KEY)
+    return client
 
-def analyze_and_translate(image_bytes: bytes, text: str) -> dict:
+def is_retryable(error: BaseException) -> bool:
+    """リトライすれば成功する可能性があるエラーか (サーバーエラー・レート制限・タイムアウト・通信エラー)"""
+    # SDKが未読み込みなら APIError は発生していない (判定のためだけに読み込まない)
+    errors = sys.modules.get("google.genai.errors")
+    if errors is not None and isinstance(error, errors.APIError):
+        return error.code in (408, 429) or error.code >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError))
+
+def hedge_delay(operation: str) -> float:
+    """ヘッジリクエストを送るまでの時間 (秒)"""
+    tracker = _latency.get(operation)
+    if tracker is None or len(tracker) < _HEDGE_MIN_SAMPLES:
+        return GEMINI_HEDGE_INITIAL_DELAY_MS / 1000
+    return max(tracker.percentile(GEMINI_HEDGE_PERCENTILE), GEMINI_HEDGE_MIN_DELAY_MS / 1000)
+
+async def _admit(operation: str, priority: Priority, expires_at: float):
+    """流量制御の枠を確保する (期限までに確保できなければ AdmissionRejected)"""
+    label = priority.name.lower()
+    try:
+        waited = await admission.acquire(priority, max(expires_at - time.monotonic(), 0))
+    except AdmissionRejected as e:
+        gemini_admission_rejections.inc(priority=label)
+        print(f"Gemini {operation} rejected by admission control: {e}")
+        raise
+    gemini_admission_wait.observe(waited, priority=label)
+
+async def _generate_once(operation: str, contents: list["types.Content"], config: Optional["types.GenerateContentConfig"]):
+    with metrics.track_gemini(operation, contents) as call:
+        response = await get_client().aio.models.generate_content(model=MODEL_NAME, contents=contents, config=config)
+        call.response_bytes = response_size(response)
+    return response
+
+async def generate_content(
+    operation: str,
+    contents: list["types.Content"],
+    config: Optional["types.GenerateContentConfig"] = None,
+    deadline: float = GEMINI_CHAT_DEADLINE_SECONDS,
+    hedge: bool = False,
+    priority: Priority = Priority.INTERACTIVE,
+):
+    """
+    Geminiを呼び出す (client.aio.models.generate_content の代わりに使う)
+    - deadline 秒 (リトライを含む全体) を過ぎたら asyncio.TimeoutError
+    - 一時的なエラーは GEMINI_MAX_RETRIES 回までジッター付きの指数バックオフでリトライ
+    - hedge=True の場合、直近のp95を過ぎても応答がなければ同じリクエストをもう1つ送り、早い方を使う
+      (ヘッジは流量制御の枠が空いている場合だけ送ります)
+    - Geminiが連続で失敗している間はサーキットブレーカーにより即座に CircuitOpen
+    - クォータ・同時実行数を超える場合は priority の順に待ち、期限までに順番が来なければ AdmissionRejected
+    """
+    expires_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            circuit_breaker.before_call()
+        except CircuitOpen:
+            gemini_circuit_rejections.inc(operation=operation)
+            raise
+        try:
+            await _admit(operation, priority, expires_at)
+        except BaseException:
+            circuit_breaker.release()
+            raise
+
+        started = time.monotonic()
+        slots = 1
+        try:
+            try:
+                call = lambda: _generate_once(operation, contents, config)
+                if hedge:
+                    def on_hedge() -> bool:
+                        nonlocal slots
+                        if not admission.try_acquire():
+                            return False # 待っている呼び出しがある間は割り込まない
+                        slots += 1
+                        gemini_hedges.inc(operation=operation)
+                        return True
+                    response = await asyncio.wait_for(hedged(call, hedge_delay(operation), on_hedge), expires_at - started)
+                else:
+                    response = await asyncio.wait_for(call(), expires_at - started)
+            finally:
+                for _ in range(slots):
+                    admission.release()
+        except Exception as e:
+            if not is_retryable(e):
+                circuit_breaker.release() # 入力エラー等はGeminiの不調ではないので数えない
+                raise
+            circuit_breaker.record_failure()
+            delay = backoff_delay(attempt, GEMINI_RETRY_BASE_SECONDS, GEMINI_RETRY_MAX_SECONDS)
+            if attempt >= GEMINI_MAX_RETRIES or time.monotonic() + delay >= expires_at or circuit_breaker.state == "open":
+                raise
+            print(f"Gemini {operation} failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s")
+            gemini_retries.inc(operation=operation)
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        circuit_breaker.record_success()
+        _latency.setdefault(operation, LatencyTracker()).add(time.monotonic() - started)
+        return response
+
+async def stream_content(
+    operation: str,
+    contents: list["types.Content"],
+    config: Optional["types.GenerateContentConfig"] = None,
+    deadline: float = GEMINI_CHAT_DEADLINE_SECONDS,
+    priority: Priority = Priority.INTERACTIVE,
+) -> AsyncIterator[str]:
+    """
+    Geminiのストリーミング応答のテキストを順に返す
+    最初のチャンクが届くまでは generate_content と同じくリトライし (期限は deadline 秒)、
+    届いた後はチャンクの間隔が GEMINI_STREAM_IDLE_SECONDS を超えたら asyncio.TimeoutError にします。
+    流量制御は generate_content と同じです (枠はストリームの終了まで使います)。
+    """
+    expires_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            circuit_breaker.before_call()
+        except CircuitOpen:
+            gemini_circuit_rejections.inc(operation=operation)
+            raise
+
+        try:
+            await _admit(operation, priority, expires_at)
+        except BaseException:
+            circuit_breaker.release()
+            raise
+
+        started = time.monotonic()
+        received_any = False
+        try:
+            try:
+                # 計測するのは最後のチャンクを受け取るまで (途中で中断された場合はそこまで)
+                with metrics.track_gemini(operation, contents) as call:
+                    stream = await asyncio.wait_for(
+                        get_client().aio.models.generate_content_stream(model=MODEL_NAME, contents=contents, config=config),
+                        expires_at - time.monotonic(),
+                    )
+                    async with aclosing(stream):
+                        while True:
+                            # 最初のチャンクは全体の期限まで、それ以降はチャンクの間隔で待つ
+                            timeout = GEMINI_STREAM_IDLE_SECONDS if received_any else expires_at - time.monotonic()
+                            try:
+                                chunk = await asyncio.wait_for(anext(stream), timeout)
+                            except StopAsyncIteration:
+                                break
+                            if not received_any:
+                                received_any = True
+                                circuit_breaker.record_success()
+                                _latency.setdefault(operation, LatencyTracker()).add(time.monotonic() - started)
+                            if chunk.text:
+                                call.response_bytes += len(chunk.text.encode("utf-8"))
+                                yield chunk.text
+            finally:
+                admission.release() # ストリームが終わるまで同時実行数の枠を使う
+            if not received_any:
+                circuit_breaker.release()
+            return
+        except Exception as e:
+            # 一部でも返した後はリトライすると応答が重複するため、そのまま失敗させる
+            if received_any or not is_retryable(e):
+                if not received_any:
+                    circuit_breaker.release()
+                raise
+            circuit_breaker.record_failure()
+            delay = backoff_delay(attempt, GEMINI_RETRY_BASE_SECONDS, GEMINI_RETRY_MAX_SECONDS)
+            if attempt >= GEMINI_MAX_RETRIES or time.monotonic() + delay >= expires_at or circuit_breaker.state == "open":
+                raise
+            print(f"Gemini {operation} failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s")
+            gemini_retries.inc(operation=operation)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+def circuit_status() -> dict:
+    """サーキットブレーカーの状態 (監視用)"""
+    return {
+        "state": circuit_breaker.state,
+        "consecutive_failures": circuit_breaker.consecutive_failures,
+        "open_count": circuit_breaker.open_count,
+        "rejections": circuit_breaker.rejections,
+    }
+
+def admission_status() -> dict:
+    """流量制御の状態 (監視用)"""
+    return {
+        "in_flight": admission.in_flight,
+        "tokens": round(admission.available_tokens(), 2),
+        "queue_depth": {p.name.lower(): admission.queue_depth(p) for p in Priority},
+    }
+
+def response_size(response) -> int:
+    """Geminiの応答テキストのバイト数 (メトリクス用)"""
+    return len((getattr(response, "text", None) or "").encode("utf-8"))
+
+def _translation_schema(languages: list[Language], extra: dict) -> dict:
+    """翻訳結果のJSONスキーマ (言語ごとのキー + extra で指定した追加項目)"""
+    properties = dict(extra)
+    properties.update({lang.response_key: {"type": "STRING"} for lang in languages})
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+def _language_list(languages: list[Language]) -> str:
+    """プロンプト用の言語一覧 (例: "English (en), Korean (ko)")"""
+    return ", ".join(f"{lang.name} ({lang.response_key})" for lang in languages)
+
+async def analyze_and_translate(image_bytes: bytes, text: str, mime_type: str = "image/jpeg") -> dict:
     """
     画像とテキストを受け取り、Geminiを使って以下の処理を行います。
     1. SNS向けの魅力的な投稿文の生成（日本語）
-    2. 多言語への翻訳（英語, 繁体字, 簡体字, 韓国語）
+    2. 多言語への翻訳（TRANSLATION_LANGUAGES の言語）
     
-    戻り値はJSON形式の辞書です。
+    戻り値はJSON形式の辞書です (日本語は "enhanced_text"、各言語は Language.response_key がキー)。
     """
     
     # AIへの指示書 (プロンプト)
     # JSONで必ず返すように厳格に指示します
-    prompt = """
+    example = {"enhanced_text": "Japanese content..."}
+    example.update({lang.response_key: f"{lang.name} content..." for lang in TRANSLATION_LANGUAGES})
+    prompt = f"""
     You are a professional social media manager for a shopping street in Japan.
     Based on the image and the shop owner's comment (text), create an engaging post for SNS.
-    Then, translate the content into English (en), Traditional Chinese (zh_tw), Simplified Chinese (zh_cn), and Korean (ko).
+    Then, translate the content into {_language_list(TRANSLATION_LANGUAGES)}.
 
     Return ONLY a JSON object with the following structure:
-    {
-        "enhanced_text": "Japanese content...",
-        "en": "English content...",
-        "zh_tw": "Traditional Chinese content...",
-        "zh_cn": "Simplified Chinese content...",
-        "ko": "Korean content..."
-    }
+    {json.dumps(example, indent=4)}
     """
     
+    from google.genai import types
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt),
+                types.Part.from_text(text=f"Owner's comment: {text}"),
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
+            ]
+        )
+    ]
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_text(text=prompt),
-                        types.Part.from_text(text=f"Owner's comment: {text}"),
-                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                    ]
-                )
-            ],
+        response = await generate_content(
+            "analyze_and_translate",
+            contents,
             # レスポンス形式をJSONに強制する設定
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
-                response_schema={
-                    "type": "OBJECT",
-                    "properties": {
-                        "enhanced_text": {"type": "STRING"},
-                        "en": {"type": "STRING"},
-                        "zh_tw": {"type": "STRING"},
-                        "zh_cn": {"type": "STRING"},
-                        "ko": {"type": "STRING"}
-                    },
-                    "required": ["enhanced_text", "en", "zh_tw", "zh_cn", "ko"]
-                }
-            )
+                response_schema=_translation_schema(TRANSLATION_LANGUAGES, {"enhanced_text": {"type": "STRING"}})
+            ),
+            deadline=GEMINI_POST_DEADLINE_SECONDS,
+            priority=Priority.STANDARD,
         )
         
         # 文字列のJSONをPython辞書に変換
@@ -76,3 +353,95 @@ def analyze_and_translate(image_bytes: bytes, text: str) -> dict:
         print(f"AI Service Error: {e}")
         # エラー時はそのまま例外を上げて呼び出し元に通知
         raise e
+
+async def translate_posts(posts: dict[int, str], languages: list[Language]) -> dict[int, dict[str, str]]:
+    """
+    既存の記事 (日本語の投稿文) を複数まとめて翻訳します (画像なしのテキストのみのリクエスト)。
+    引数は {記事ID: 本文}、戻り値は {記事ID: {言語コード: 翻訳文}} です。
+    レスポンスに含まれなかった記事は戻り値にも含まれません。
+    """
+    prompt = f"""
+    You are a professional translator for a shopping street in Japan.
+    Translate each of the following SNS posts into {_language_list(languages)}.
+    Keep the tone, emoji and hashtags of the original posts.
+
+    Return ONLY a JSON array with one object per post, using the same "id" as the input.
+    """
+    items = [{"id": post_id, "text": text} for post_id, text in posts.items()]
+
+    from google.genai import types
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt),
+                types.Part.from_text(text=json.dumps(items, ensure_ascii=False)),
+            ]
+        )
+    ]
+    try:
+        response = await generate_content(
+            "translate_posts",
+            contents,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema={
+                    "type": "ARRAY",
+                    "items": _translation_schema(languages, {"id": {"type": "INTEGER"}}),
+                }
+            ),
+            deadline=GEMINI_POST_DEADLINE_SECONDS,
+            priority=Priority.BATCH, # 既存記事の翻訳は急がないので、チャットや記事作成を優先する
+        )
+
+        results = {}
+        for item in json.loads(response.text):
+            post_id = item.get("id")
+            if post_id not in posts:
+                continue # 依頼していないIDは無視する
+            translations = {lang.code: item.get(lang.response_key) for lang in languages}
+            results[post_id] = {code: content for code, content in translations.items() if content}
+        return results
+    except Exception as e:
+        print(f"AI Service Error: {e}")
+        raise e
+
+async def summarize_conversation(summary: str, turns: list) -> str:
+    """
+    チャットの古い発言を、これまでの要約と合わせて1つの短い要約にまとめます (会話履歴の圧縮用)。
+    turns は role ("user" / "model") と content を持つ発言のリストです。
+    """
+    conversation = "\n".join(f"{'Tourist' if item.role == 'user' else 'Guide'}: {item.content}" for item in turns)
+    prompt = f"""
+    You are summarizing a conversation between a tourist and an AI guide for a shopping street in Japan.
+    Merge the previous summary and the new messages into one concise summary (at most 150 words).
+    Keep the tourist's preferences, the shops that were mentioned, and any open questions.
+    Write the summary in the language the tourist is using.
+
+    Previous summary:
+    {summary or "(none)"}
+    """
+
+    from google.genai import types
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt),
+                types.Part.from_text(text=f"New messages:\n{conversation}"),
+            ]
+        )
+    ]
+    response = await generate_content(
+        "chat_summary",
+        contents,
+        config=types.GenerateContentConfig(temperature=0.2),
+        deadline=GEMINI_CHAT_DEADLINE_SECONDS,
+        priority=Priority.STANDARD, # 応答を返した後に行うため、利用者が待っているチャットを優先する
+    )
+    text = (response.text or "").strip()
+    if not text:
+        raise ValueError("Gemini returned an empty summary")
+    return text
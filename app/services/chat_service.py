@@ -1,37 +1,96 @@
+import os
+import re
+import unicodedata
+from contextlib import aclosing
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from google.genai import types
-from app.services import shop_service, ai_service
+from app.cache import LRUCache
+from app.services import ai_service, retrieval_service, shop_context_service
 from app.schemas.chat import ChatHistoryItem
 
-async def generate_chat_response(db: AsyncSession, message: str, history: list[ChatHistoryItem] = []) -> str:
+if TYPE_CHECKING:
+    from google.genai import types
+
+# Gemini呼び出しに失敗した場合の応答
+FALLBACK_RESPONSE = "Sorry, I am having trouble connecting to my brain right now. Please try again later."
+
+# よくある質問への回答キャッシュ (会話履歴のない1往復目の質問のみ対象)
+CHAT_ANSWER_CACHE_SIZE = int(os.getenv("CHAT_ANSWER_CACHE_SIZE", "512"))
+CHAT_ANSWER_CACHE_TTL_SECONDS = int(os.getenv("CHAT_ANSWER_CACHE_TTL_SECONDS", "600"))
+
+answer_cache = LRUCache(maxsize=CHAT_ANSWER_CACHE_SIZE, ttl=CHAT_ANSWER_CACHE_TTL_SECONDS)
+_answer_cache_generation = 0
+
+_SPACES_RE = re.compile(r"\s+")
+# 末尾の句読点・記号 (「？」「!」「。」など) は質問の意味を変えないので無視する
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.。、,？！~〜]+$")
+
+def normalize_message(message: str) -> str:
+    """キャッシュキー用に質問文を正規化する (全角半角・大文字小文字・空白・末尾の記号の違いを吸収)"""
+    text = unicodedata.normalize("NFKC", message).lower().strip()
+    text = _SPACES_RE.sub(" ", text)
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+def answer_cache_key(message: str, history: list[ChatHistoryItem], summary: str = "") -> Optional[tuple]:
     """
-    ユーザーのチャットメッセージに対するAIの応答を生成します。
+    回答キャッシュのキーを返す (キャッシュ対象外の場合はNone)
+    店舗情報の世代をキーに含めるため、店舗が変更されると古い回答は使われません
+    """
+    global _answer_cache_generation
+    if history or summary:
+        return None # 会話の続きは文脈に依存するためキャッシュしない
+    generation = shop_context_service.current_generation()
+    if generation != _answer_cache_generation:
+        # 店舗が変更されたら古い世代の回答はまとめて捨てる
+        answer_cache.clear()
+        _answer_cache_generation = generation
+    return (normalize_message(message), generation)
+
+async def prepare_chat(
+    db: AsyncSession, message: str, history: list[ChatHistoryItem] = [], summary: str = "",
+) -> tuple[list["types.Content"], "types.GenerateContentConfig"]:
+    """
+    Geminiに送るメッセージと設定を組み立てます。
     RAG (Retrieval-Augmented Generation) の簡易実装として、
-    現在登録されている全店舗情報をコンテキスト（文脈）としてAIに与えます。
+    質問に関連する店舗情報だけを検索し、コンテキスト（文脈）としてAIに与えます。
+    summary には会話の古い部分の要約 (チャットセッションで圧縮したもの) を指定できます。
     """
-    # 1. コンテキスト作成のために全店舗データを取得
-    # 店舗数が増えた場合は、ベクトル検索などへの移行を検討する必要があります
-    shops = await shop_service.get_shops(db, limit=1000)
-    
-    # 2. 店舗データをプロンプト用に整形
-    shops_context = ""
-    for shop in shops:
-        shops_context += f"- ID: {shop.id}, Name: {shop.name}, Category: {shop.category}, Description: {shop.description}, Location: {shop.location}, Map URL: {shop.map_url}, Reservation URL: {shop.reservation_url}\n"
-        
+    # 1. 検索インデックスから質問に関連する店舗を取得
+    # 直前のユーザー発言も含めて検索し、「そこはどこ？」のような続きの質問にも対応する
+    await retrieval_service.ensure_loaded(db)
+    query = message
+    previous_user_messages = [item.content for item in history if item.role == "user"]
+    if previous_user_messages:
+        query = f"{previous_user_messages[-1]}\n{message}"
+    shop_ids = retrieval_service.search_shop_ids(query)
+
+    # 2. 整形済みの店舗データからプロンプト用の文字列を作成
+    # スナップショットは店舗が変更された時だけ作り直されるため、通常はDBにアクセスしない
+    snapshot = await shop_context_service.get_snapshot(db)
+    shops_context = snapshot.render(shop_ids)
+
     # 3. システムプロンプトの構築
     # ここでAIの役割（ペルソナ）と知識（店舗リスト）を定義します
     system_instruction = f"""
     You are a friendly and helpful AI tourist guide for the 'Kamitori Shopping Street' (Kamitori Shoueikai) in Kumamoto, Japan.
-    
-    Here is a list of shops in the shopping street:
+
+    Here is a list of shops in the shopping street that are relevant to the question:
     {shops_context}
-    
+
     Please answer the user's question based on this information.
     If the user asks about location or where a shop is, please provide the 'Map URL' if available.
     If the user asks about reservation or booking, provide the 'Reservation URL' if available.
     Respond in the same language as the user's question.
     """
+    if summary:
+        system_instruction += f"""
+    Summary of the earlier conversation with this user:
+    {summary}
+    """
     # Gemini APIの形式 (types.Content) に変換
+    # SDKは起動を速くするため最初のチャットで読み込む (ai_service.get_client を参照)
+    from google.genai import types
+
     contents = []
 
     for item in history:
@@ -42,24 +101,55 @@ async def generate_chat_response(db: AsyncSession, message: str, history: list[C
             role=role,
             parts=[types.Part.from_text(text=item.content)]
         ))
-    
+
     # 最新のメッセージを追加
     contents.append(types.Content(
         role="user",
         parts=[types.Part.from_text(text=message)]
     ))
-    
+
+    config = types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        temperature=0.7, # 創造性の度合い (0.0~2.0)
+    )
+    return contents, config
+
+async def generate_chat_response(db: AsyncSession, message: str, history: list[ChatHistoryItem] = [], summary: str = "") -> str:
+    """
+    ユーザーのチャットメッセージに対するAIの応答を生成します。
+    よくある質問 (会話履歴なし) はキャッシュから返し、Geminiを呼び出しません。
+    """
+    cache_key = answer_cache_key(message, history, summary)
+    if cache_key is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    contents, config = await prepare_chat(db, message, history, summary)
+
     # 4. Gemini APIを呼び出して回答生成
     try:
-        response = ai_service.client.models.generate_content(
-            model=ai_service.MODEL_NAME,
-            contents=contents,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.7, # 創造性の度合い (0.0~2.0)
-            )
+        # タイムアウト・リトライ付きで呼び出し、遅い場合はヘッジリクエストを送る (GEMINI_HEDGE_CHAT)
+        response = await ai_service.generate_content(
+            "chat",
+            contents,
+            config=config,
+            deadline=ai_service.GEMINI_CHAT_DEADLINE_SECONDS,
+            hedge=ai_service.GEMINI_HEDGE_CHAT,
         )
+        if cache_key is not None and response.text:
+            answer_cache.set(cache_key, response.text)
         return response.text
     except Exception as e:
         print(f"Chat Service Error: {e}")
-        return "Sorry, I am having trouble connecting to my brain right now. Please try again later."
+        return FALLBACK_RESPONSE
+
+async def stream_chat_response(contents: list["types.Content"], config: "types.GenerateContentConfig") -> AsyncIterator[str]:
+    """
+    prepare_chat で組み立てたリクエストをストリーミングで送り、応答を少しずつ返します。
+    呼び出し側がイテレーションを途中でやめる (aclose / キャンセル) と、Geminiへの通信も中断されます。
+    """
+    stream = ai_service.stream_content("chat_stream", contents, config=config)
+    async with aclosing(stream):
+        async for text in stream:
+            yield text
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import secrets
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app import metrics
+from app.cache import LRUCache
+from app.schemas.chat import ChatHistoryItem
+from app.services import ai_service
+
+# サーバー側で保持するチャットの会話 (セッション)
+# プロセス内に保持するため、複数ワーカーで動かす場合は同じセッションが同じワーカーに届くようにしてください
+# (別のワーカーに届いた場合は新しいセッションとして扱われます)
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+# 最後の発言からこの時間 (秒) が経つとセッションを破棄する
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800"))
+# 要約と会話の合計がこのトークン数 (概算) を超えたら、古い発言を要約にまとめる
+CHAT_SESSION_TOKEN_BUDGET = int(os.getenv("CHAT_SESSION_TOKEN_BUDGET", "1500"))
+# 要約せずにそのまま残す直近の往復数
+CHAT_SESSION_RECENT_TURNS = int(os.getenv("CHAT_SESSION_RECENT_TURNS", "2"))
+
+@dataclass
+class ChatSession:
+    """
+    1人の利用者との会話
+    古い発言は summary にまとめ、turns には要約していない発言 (user / model の交互) だけを残します
+    """
+    id: str
+    summary: str = ""
+    turns: list[ChatHistoryItem] = field(default_factory=list)
+    summarized_turns: int = 0 # 要約にまとめた発言の数 (統計用)
+    compacting: bool = False
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(item.content) for item in self.turns)
+
+_sessions = LRUCache(maxsize=CHAT_SESSION_MAX, ttl=CHAT_SESSION_TTL_SECONDS)
+# 実行中の要約タスク (ガベージコレクションで消えないように参照を持っておく)
+_compaction_tasks: set[asyncio.Task] = set()
+
+session_compactions = metrics.Counter(
+    "chat_session_compactions_total", "Chat session history compactions by result", ("result",),
+)
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算 (英数字はおよそ4文字で1トークン、日本語などはおよそ1文字で1トークン)"""
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def get_or_create(session_id: Optional[str], history: list[ChatHistoryItem] = []) -> ChatSession:
+    """
+    セッションを取得する
+    見つからない場合 (期限切れ・別のワーカーなど) は新しいIDで作り、history があれば会話の続きとして引き継ぎます
+    """
+    session = _sessions.get(session_id) if session_id else None
+    if session is None:
+        session = ChatSession(id=secrets.token_urlsafe(16), turns=list(history))
+        _sessions.set(session.id, session)
+        _maybe_compact(session)
+    return session
+
+def record_turn(session: ChatSession, message: str, answer: str):
+    """1往復分の発言を追加する (セッションの期限も延長される)"""
+    session.turns.append(ChatHistoryItem(role="user", content=message))
+    session.turns.append(ChatHistoryItem(role="model", content=answer))
+    _sessions.set(session.id, session)
+    _maybe_compact(session)
+
+def _maybe_compact(session: ChatSession):
+    """予算を超えていれば、バックグラウンドで古い発言を要約にまとめる (応答は待たせない)"""
+    if session.compacting or session.tokens() <= CHAT_SESSION_TOKEN_BUDGET:
+        return
+    if len(session.turns) <= CHAT_SESSION_RECENT_TURNS * 2:
+        return # 直近の発言だけで予算を超えている場合は要約しない
+    session.compacting = True
+    task = asyncio.create_task(compact(session))
+    _compaction_tasks.add(task)
+    task.add_done_callback(_compaction_tasks.discard)
+
+async def compact(session: ChatSession):
+    """直近 CHAT_SESSION_RECENT_TURNS 往復より前の発言を、これまでの要約と合わせて1つの要約にまとめる"""
+    session.compacting = True
+    try:
+        count = len(session.turns) - CHAT_SESSION_RECENT_TURNS * 2
+        if count <= 0:
+            return
+        older = session.turns[:count]
+        try:
+            session.summary = await ai_service.summarize_conversation(session.summary, older)
+        except Exception as e:
+            print(f"Chat session compaction failed: {e}")
+            session_compactions.inc(result="error")
+            _truncate(session)
+            return
+        # 要約している間に追加された発言は末尾にあるため、先頭の count 件だけを消せばよい
+        del session.turns[:count]
+        session.summarized_turns += count
+        session_compactions.inc(result="ok")
+    finally:
+        session.compacting = False
+
+def _truncate(session: ChatSession):
+    """要約できなかった場合でも、予算の2倍を超えた分は古い往復から捨てて上限を守る"""
+    while session.tokens() > CHAT_SESSION_TOKEN_BUDGET * 2 and len(session.turns) > CHAT_SESSION_RECENT_TURNS * 2:
+        del session.turns[:2]
+        session.summarized_turns += 2
+        session_compactions.inc(result="truncated")
+
+def stats() -> dict:
+    """セッションの保持状況 (監視用)"""
+    return _sessions.stats()
@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.cache import LRUCache
+from app.pagination import NEXT_CURSOR_HEADER
+from app.schemas.post import PostResponse
+
+# ページサイズごとに先頭から何ページ分をキャッシュするか
+FEED_CACHE_PAGES = int(os.getenv("FEED_CACHE_PAGES", "5"))
+FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "256"))
+# ワーカープロセスが複数ある場合、他プロセスでの投稿はこの時間内に反映されます
+FEED_CACHE_TTL_SECONDS = int(os.getenv("FEED_CACHE_TTL_SECONDS", "30"))
+# この大きさ以上のレスポンスはgzip圧縮版も保持する
+FEED_CACHE_GZIP_MIN_BYTES = int(os.getenv("FEED_CACHE_GZIP_MIN_BYTES", "1024"))
+
+_posts_adapter = TypeAdapter(list[PostResponse])
+
+@dataclass
+class FeedPage:
+    """シリアライズ済みの記事一覧レスポンス"""
+    body: bytes
+    etag: str
+    next_cursor: Optional[str] = None
+    gzip_body: Optional[bytes] = None
+
+_pages = LRUCache(maxsize=FEED_CACHE_MAX_ENTRIES, ttl=FEED_CACHE_TTL_SECONDS)
+# 記事が追加・削除されるたびに進む世代 (古い世代で作ったページを保存しないために使う)
+_generation = 0
+
+def cache_key(skip: int, limit: int, cursor: Optional[str], lang: Optional[str]) -> Optional[Hashable]:
+    """
+    キャッシュ対象のページならキーを返す
+    カーソル指定のない先頭 FEED_CACHE_PAGES ページ (skip がページ境界のもの) だけが対象です
+    """
+    if cursor or limit <= 0 or skip % limit != 0 or skip // limit >= FEED_CACHE_PAGES:
+        return None
+    return (skip, limit, lang)
+
+def current_generation() -> int:
+    return _generation
+
+def invalidate():
+    """記事の作成・削除時に呼び出し、キャッシュ済みのページを全て破棄する"""
+    global _generation
+    _generation += 1
+    _pages.clear()
+
+def get(key: Hashable) -> Optional[FeedPage]:
+    return _pages.get(key)
+
+def put(key: Hashable, page: FeedPage, generation: int):
+    """ページを保存する (作成中に記事が変更された場合は保存しない)"""
+    if generation == _generation:
+        _pages.set(key, page)
+
+def build_page(posts, next_cursor: Optional[str] = None) -> FeedPage:
+    """ORMの記事リストをシリアライズしてETag付きのページにする"""
+    body = _posts_adapter.dump_json(_posts_adapter.validate_python(posts, from_attributes=True))
+    return make_page(body, next_cursor)
+
+def make_page(body: bytes, next_cursor: Optional[str] = None) -> FeedPage:
+    """シリアライズ済みのJSONからETag付きのページを作る"""
+    page = FeedPage(
+        body=body,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        next_cursor=next_cursor,
+    )
+    if len(body) >= FEED_CACHE_GZIP_MIN_BYTES:
+        page.gzip_body = gzip.compress(body, compresslevel=6)
+    return page
+
+def respond(request: Request, page: FeedPage, cache_status: str) -> Response:
+    """
+    ページをレスポンスにする
+    If-None-Match がETagと一致すれば304を返し、gzipを受け付けるクライアントには圧縮版を返します
+    """
+    headers = {
+        "ETag": page.etag,
+        "Cache-Control": "no-cache", # キャッシュしてよいが、毎回ETagで再検証させる
+        "Vary": "Accept-Encoding",
+        "X-Cache": cache_status,
+    }
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and page.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if page.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=page.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+def stats() -> dict:
+    """キャッシュの統計情報 (ヒット率など)"""
+    return {**_pages.stats(), "generation": _generation}
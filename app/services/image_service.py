@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import io
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import UploadFile
+
+UPLOAD_DIR = "static/images"
+# アップロード画像のサイズ上限 (バイト)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+# ディスクへ書き込む単位
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 画像変換に使うプロセス数
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Geminiに送る画像の長辺 (px)。解析には十分な大きさに縮小して送信量を減らす
+GEMINI_MAX_EDGE = 1024
+# 表示用の派生画像 (名前 -> 長辺px)
+VARIANT_SIZES = {
+    "thumb": 320,
+    "feed": 960,
+    "full": 2048,
+}
+# 派生画像の形式 (名前 -> (Pillowの形式名, 拡張子))
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+# 保存する元画像の拡張子 (Pillowが判別した形式 -> 拡張子)。ここにない形式は形式名を小文字にしたもの
+UPLOAD_EXTENSIONS = {
+    "JPEG": "jpg",
+    "MPO": "jpg", # iPhoneなどの複数画像JPEG
+    "PNG": "png",
+    "GIF": "gif",
+    "WEBP": "webp",
+    "TIFF": "tif",
+}
+
+class UploadTooLarge(Exception):
+    """アップロード画像がサイズ上限を超えた場合の例外"""
+
+class InvalidImage(Exception):
+    """画像として読み込めないファイルの場合の例外"""
+
+@dataclass
+class StoredImage:
+    """ディスクに保存したアップロード画像"""
+    file_path: str # ディスク上のパス
+    url: str # Webからアクセス可能なパス
+    digest: str # 画像データのSHA-256 (hex)
+    size: int
+    created: bool = True # このアップロードで新しく書き込んだか (Falseは同じ内容の既存ファイルを使った場合)
+
+def file_url(file_path: str) -> str:
+    """static配下のファイルパスをWeb公開パスに変換する"""
+    return "/" + os.path.relpath(file_path).replace(os.sep, "/")
+
+def content_path(digest: str, extension: str) -> str:
+    """内容のハッシュ値から保存先パスを決める (同じ画像は同じファイル名になる)"""
+    return os.path.join(UPLOAD_DIR, f"{digest}.{extension}")
+
+def detect_extension(head: bytes, filename: Optional[str]) -> str:
+    """
+    画像の先頭部分から保存用の拡張子を決める
+    Pillowで形式を判別できない場合はファイル名の拡張子 (なければ jpg) を使います
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # Image.open はヘッダーだけを読むため、先頭のチャンクで判別できる
+        with Image.open(io.BytesIO(head)) as img:
+            image_format = img.format
+    except (UnidentifiedImageError, OSError):
+        image_format = None
+    if image_format:
+        return UPLOAD_EXTENSIONS.get(image_format, image_format.lower())
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return extension if extension.isalnum() else "jpg"
+
+async def save_upload(image: UploadFile) -> StoredImage:
+    """
+    アップロード画像をチャンク単位でディスクに書き込む
+    画像全体をメモリに載せず、書き込みと同時にSHA-256を計算し、
+    ハッシュ値をファイル名にして保存します (同じ画像の再アップロードは既存ファイルを使う)
+    拡張子は画像の形式から決めます
+    """
+    if image.size is not None and image.size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Image is larger than {MAX_UPLOAD_BYTES} bytes")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # ハッシュ値が決まるまでは一時ファイルに書き込む
+    temp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4()}.tmp")
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with open(temp_path, "wb") as buffer:
+            while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(f"Image is larger than {MAX_UPLOAD_BYTES} bytes")
+                digest.update(chunk)
+                if not head:
+                    head = chunk # 形式の判別用
+                # ディスク書き込みはスレッドで行い、イベントループを止めない
+                await asyncio.to_thread(buffer.write, chunk)
+    except BaseException:
+        os.remove(temp_path) # 途中まで書いたファイルは残さない
+        raise
+
+    file_path = content_path(digest.hexdigest(), detect_extension(head, image.filename))
+    created = not os.path.exists(file_path)
+    if created:
+        os.replace(temp_path, file_path)
+    else:
+        os.remove(temp_path) # 同じ内容のファイルが既にあるので重複して保存しない
+
+    return StoredImage(file_path=file_path, url=file_url(file_path), digest=digest.hexdigest(), size=size, created=created)
+
+def _resize(img, max_edge: int):
+    from PIL import Image
+
+    if max(img.size) <= max_edge:
+        return img
+    resized = img.copy()
+    resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return resized
+
+def render_variants(src_path: str, out_stem: str) -> tuple[bytes, dict[str, dict[str, str]]]:
+    """
+    元画像からGemini送信用のJPEGと表示用の派生画像を作る (プロセスプールで実行される)
+    派生画像のファイル名は元画像のハッシュ値から決まるため、既にあるものは作り直しません
+    戻り値: (Gemini用JPEGデータ, {派生名: {形式: ファイルパス}})
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(src_path) as opened:
+            # スマホ写真の向き (EXIF) を反映し、透過やCMYKはRGBに揃える
+            img = ImageOps.exif_transpose(opened).convert("RGB")
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImage(str(e))
+
+    gemini_input = io.BytesIO()
+    _resize(img, GEMINI_MAX_EDGE).save(gemini_input, "JPEG", quality=85)
+
+    variants: dict[str, dict[str, str]] = {}
+    for name, max_edge in VARIANT_SIZES.items():
+        resized = _resize(img, max_edge)
+        variants[name] = {}
+        for fmt, (pil_format, extension) in VARIANT_FORMATS.items():
+            path = f"{out_stem}_{name}.{extension}"
+            if not os.path.exists(path):
+                # 書きかけのファイルが配信されないよう、一時ファイルに書いてから置き換える
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                resized.save(temp_path, pil_format, quality=80, optimize=True)
+                os.replace(temp_path, path)
+            variants[name][fmt] = path
+    return gemini_input.getvalue(), variants
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _process_pool
+
+async def build_variants(stored: StoredImage) -> tuple[bytes, dict[str, dict[str, str]]]:
+    """
+    保存済みの画像から派生画像を作る (CPU負荷が高いため別プロセスで実行)
+    戻り値: (Gemini用JPEGデータ, {派生名: {形式: Web公開パス}})
+    """
+    out_stem = os.path.splitext(stored.file_path)[0]
+    gemini_bytes, variant_paths = await asyncio.get_running_loop().run_in_executor(
+        _get_process_pool(), render_variants, stored.file_path, out_stem
+    )
+    variants = {
+        name: {fmt: file_url(path) for fmt, path in formats.items()}
+        for name, formats in variant_paths.items()
+    }
+    return gemini_bytes, variants
+
+def shutdown():
+    """アプリ終了時にプロセスプールを停止する"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
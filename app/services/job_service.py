@@ -0,0 +1,121 @@
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from app.database import AsyncSessionLocal
+from app.services import post_service, translation_cache_service
+
+# ワーカー数とキューの上限 (Geminiへの同時リクエスト数を抑えるため小さめに設定)
+POST_JOB_WORKERS = int(os.getenv("POST_JOB_WORKERS", "2"))
+POST_JOB_QUEUE_SIZE = int(os.getenv("POST_JOB_QUEUE_SIZE", "100"))
+# メモリ上に保持する完了済みジョブの件数
+POST_JOB_HISTORY = int(os.getenv("POST_JOB_HISTORY", "1000"))
+
+class JobQueueFull(Exception):
+    """ジョブキューが満杯で受け付けられない場合の例外"""
+
+@dataclass
+class PostJob:
+    """
+    記事生成ジョブの状態
+    status: queued -> running -> succeeded / failed
+    """
+    id: str
+    post_id: int
+    original_text: str
+    gemini_image: Optional[bytes] = field(default=None, repr=False) # Gemini送信用の縮小画像 (JPEG)
+    image_digest: str = ""
+    status: str = "queued"
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+_jobs: "OrderedDict[str, PostJob]" = OrderedDict()
+_queue: Optional[asyncio.Queue] = None
+_workers: list[asyncio.Task] = []
+
+def _get_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=POST_JOB_QUEUE_SIZE)
+    return _queue
+
+def _remember(job: PostJob):
+    """ジョブを登録し、古い完了済みジョブを捨てる"""
+    _jobs[job.id] = job
+    while len(_jobs) > POST_JOB_HISTORY:
+        oldest_id, oldest = next(iter(_jobs.items()))
+        if oldest.status in ("queued", "running"):
+            break
+        del _jobs[oldest_id]
+
+def enqueue(post_id: int, original_text: str, gemini_image: bytes, image_digest: str) -> PostJob:
+    """
+    下書き投稿のAI生成ジョブをキューに積む
+    キューが満杯の場合は JobQueueFull を送出します
+    """
+    job = PostJob(id=uuid.uuid4().hex, post_id=post_id, original_text=original_text, gemini_image=gemini_image, image_digest=image_digest)
+    try:
+        _get_queue().put_nowait(job)
+    except asyncio.QueueFull:
+        raise JobQueueFull("Post generation queue is full")
+    _remember(job)
+    return job
+
+def get_job(job_id: str) -> Optional[PostJob]:
+    """ジョブIDで状態を取得する"""
+    return _jobs.get(job_id)
+
+def is_full() -> bool:
+    """キューが満杯かどうか"""
+    return _get_queue().full()
+
+def queue_depth() -> int:
+    """処理待ちのジョブ数"""
+    return _get_queue().qsize()
+
+async def _run_job(job: PostJob):
+    job.status = "running"
+    try:
+        ai_result = await translation_cache_service.analyze_and_translate(job.gemini_image, job.original_text, image_digest=job.image_digest)
+        async with AsyncSessionLocal() as db:
+            await post_service.add_translations(db, job.post_id, ai_result) # 下書きを公開する
+        job.status = "succeeded"
+    except Exception as e:
+        print(f"Post Job Error ({job.id}): {e}")
+        job.status = "failed"
+        job.error = str(e)
+        # 翻訳のない記事を残さないよう下書きを削除する (やり直す場合は投稿し直してもらう)
+        try:
+            async with AsyncSessionLocal() as db:
+                await post_service.delete_draft_post(db, job.post_id)
+        except Exception as delete_error:
+            print(f"Post Job Error ({job.id}): failed to delete draft {job.post_id}: {delete_error}")
+    finally:
+        job.gemini_image = None
+        job.finished_at = datetime.utcnow()
+
+async def _worker():
+    queue = _get_queue()
+    while True:
+        job = await queue.get()
+        try:
+            await _run_job(job)
+        finally:
+            queue.task_done()
+
+async def start_workers():
+    """アプリ起動時にワーカーを起動する"""
+    for _ in range(POST_JOB_WORKERS - len(_workers)):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_workers():
+    """アプリ終了時にワーカーを停止する"""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
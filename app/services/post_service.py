@@ -1,80 +1,282 @@
+import datetime
 import os
-import shutil
-import uuid
+from typing import Optional
+from sqlalchemy import and_, case, delete, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi import UploadFile
-from app.models import Post, Translation
+from app.languages import SOURCE_LANGUAGE, TRANSLATION_LANGUAGES
+from app.models import POST_STATUS_PENDING, POST_STATUS_PUBLISHED, Post, Translation
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
 from app.schemas.post import PostCreate
-from app.services import ai_service
-from sqlalchemy.orm import selectinload
+from app.services import feed_cache_service, image_service, retrieval_service, translation_cache_service
+from sqlalchemy.orm import aliased, contains_eager, selectinload
 
-UPLOAD_DIR = "static/images"
+async def get_post(db: AsyncSession, post_id: int):
+    """
+    IDで記事を1件取得する (翻訳データも含む)
+    """
+    # Post取得時にtranslationsも一緒に引いてくる
+    stmt = select(Post).options(selectinload(Post.translations)).where(Post.id == post_id)
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+async def add_translations(db: AsyncSession, post_id: int, ai_result: dict, image_variants: Optional[dict] = None):
+    """
+    AIの生成結果を翻訳(Translation)データとして保存し、保存後の記事を返す
+    下書きの記事は公開状態になります。image_variants を指定した場合は派生画像のパスも記録します
+    """
+    values = {"status": POST_STATUS_PUBLISHED}
+    if image_variants is not None:
+        values["image_variants"] = image_variants
+    await db.execute(update(Post).where(Post.id == post_id).values(**values))
+
+    languages = {
+        SOURCE_LANGUAGE.code: ai_result.get("enhanced_text"), # AIが生成した魅力的な日本語文も翻訳の一種として扱う
+    }
+    for lang in TRANSLATION_LANGUAGES:
+        languages[lang.code] = ai_result.get(lang.response_key)
+
+    for lang_code, content in languages.items():
+        if content:
+            trans = Translation(
+                post_id=post_id,
+                language=lang_code,
+                translated_content=content
+            )
+            db.add(trans)
+
+    await db.commit()
+    feed_cache_service.invalidate() # 記事一覧のキャッシュを破棄
+
+    # 翻訳データも含めて再取得 (Eager loading)
+    db_post = await get_post(db, post_id)
+    retrieval_service.add_post(db_post) # チャット用の検索インデックスに反映
+    return db_post
+
+async def create_draft_post(db: AsyncSession, shop_id: int, original_text: str, image_path: str, image_variants: Optional[dict] = None):
+    """
+    翻訳前の下書き投稿を保存する
+    下書きは add_translations で公開されるまで一覧・検索・チャットに表示されません
+    """
+    db_post = Post(
+        shop_id=shop_id,
+        original_text=original_text,
+        image_path=image_path,
+        image_variants=image_variants,
+        status=POST_STATUS_PENDING,
+    )
+    db.add(db_post)
+    await db.commit()
+    await db.refresh(db_post)
+    return db_post
+
+async def delete_draft_post(db: AsyncSession, post_id: int):
+    """
+    公開前の下書き投稿を削除する (AI生成に失敗した場合など。公開済みの記事は削除しない)
+    """
+    await db.execute(delete(Post).where(Post.id == post_id, Post.status == POST_STATUS_PENDING))
+    await db.commit()
+
+async def _store_image(image: UploadFile) -> tuple[image_service.StoredImage, bytes, dict]:
+    """
+    アップロード画像を保存し、派生画像 (サムネイル等・Gemini送信用の縮小版) を作る
+    画像として読み込めない場合は InvalidImage を送出します
+    """
+    stored = await image_service.save_upload(image)
+    try:
+        gemini_image, image_variants = await image_service.build_variants(stored)
+    except image_service.InvalidImage:
+        # 同じ内容のファイルは他の記事が使っている可能性があるため、このアップロードで作ったファイルだけを消す
+        if stored.created:
+            os.remove(stored.file_path)
+        raise
+    return stored, gemini_image, image_variants
 
 async def create_post_with_ai(db: AsyncSession, shop_id: int, original_text: str, image: UploadFile):
     """
     画像とテキストを受け取り、AIで解析・翻訳した上でDBに保存する
     """
-    # 1. 画像ファイルの保存
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_extension = image.filename.split(".")[-1]
-    file_name = f"{uuid.uuid4()}.{file_extension}" # ファイル名重複防止のためにUUIDを使用
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    content = await image.read() # AI送信用にデータをメモリに読み込む
-    
-    # ディスクへの書き込み
-    # (画像データはポインタが進んでいる可能性があるため、書き込みはAI送信後か、リセットが必要だが
-    #  変数 content に保持しているのでこれを使う)
-    with open(file_path, "wb") as buffer:
-        buffer.write(content)
-        
+    # 1. 画像ファイルの保存と派生画像 (サムネイル等・Gemini送信用の縮小版) の作成
+    stored, gemini_image, image_variants = await _store_image(image)
+
     # 2. AIサービスの呼び出し (記事生成・翻訳)
-    ai_result = ai_service.analyze_and_translate(content, original_text)
-    
+    # 同じ画像・コメントの再投稿はキャッシュから返す
+    ai_result = await translation_cache_service.analyze_and_translate(gemini_image, original_text, image_digest=stored.digest)
+
     # 3. データベースへの保存
-    
+
     # 投稿(Post)データの作成
     db_post = Post(
         shop_id=shop_id,
         original_text=original_text,
-        image_path=f"/static/images/{file_name}" # Webからアクセス可能なパス
+        image_path=stored.url,
+        image_variants=image_variants,
     )
     db.add(db_post)
     await db.flush() # IDを発行させるためにflush
-    
+
     # 翻訳(Translation)データの作成
-    languages = {
-        "ja": ai_result.get("enhanced_text"), # AIが生成した魅力的な日本語文も翻訳の一種として扱う
-        "en": ai_result.get("en"),
-        "zh-tw": ai_result.get("zh_tw"),
-        "zh-cn": ai_result.get("zh_cn"),
-        "ko": ai_result.get("ko")
-    }
-    
-    for lang_code, content in languages.items():
-        if content:
-            trans = Translation(
-                post_id=db_post.id,
-                language=lang_code,
-                translated_content=content
-            )
-            db.add(trans)
-            
-    await db.commit()
-    await db.refresh(db_post)
-    
-    # レスポンス用に翻訳データも含めて再取得 (Eager loading)
-    # Post取得時にtranslationsも一緒に引いてくる
-    stmt = select(Post).options(selectinload(Post.translations)).where(Post.id == db_post.id)
-    result = await db.execute(stmt)
-    return result.scalars().first()
+    # レスポンス用に翻訳データも含めた記事が返る
+    return await add_translations(db, db_post.id, ai_result)
+
+async def create_post_job(db: AsyncSession, shop_id: int, original_text: str, image: UploadFile):
+    """
+    画像と下書き投稿だけを保存し、AI生成・翻訳はバックグラウンドのジョブに任せる
+    画像の検証と派生画像の作成はここで行うため、画像でないファイルは InvalidImage になります
+    """
+    # 循環importを避けるため関数内でimport
+    from app.services import job_service
+
+    # キューが満杯なら画像や下書きを残さないよう先に弾く
+    if job_service.is_full():
+        raise job_service.JobQueueFull("Post generation queue is full")
+
+    stored, gemini_image, image_variants = await _store_image(image)
+    db_post = await create_draft_post(db, shop_id, original_text, stored.url, image_variants)
+    try:
+        return job_service.enqueue(db_post.id, original_text, gemini_image, stored.digest)
+    except job_service.JobQueueFull:
+        await delete_draft_post(db, db_post.id) # 画像の処理中に満杯になった場合
+        raise
+
+# 言語ごとの翻訳のフォールバック順 (指定言語の翻訳がない場合は順に次の言語を使う)
+# ここにない言語は、指定言語 → 英語 → 日本語 の順になります
+LANGUAGE_FALLBACKS = {
+    "zh-tw": ["zh-tw", "zh-cn", "en"],
+    "zh-cn": ["zh-cn", "zh-tw", "en"],
+    "ko": ["ko", "en"],
+    "en": ["en"],
+    "ja": ["ja"],
+}
 
-async def get_posts(db: AsyncSession, skip: int = 0, limit: int = 100):
+def language_fallback_chain(lang: str) -> list[str]:
+    """指定言語のフォールバック順を返す (最後は必ず英語 → 日本語)"""
+    chain = LANGUAGE_FALLBACKS.get(lang, [lang]) + ["en", "ja"]
+    return list(dict.fromkeys(chain)) # 順序を保ったまま重複を除く
+
+def _best_translation_id(chain: list[str]):
     """
-    記事一覧を取得する
+    記事ごとに、フォールバック順で最も優先度の高い翻訳のIDを返す相関サブクエリ
     """
+    candidate = aliased(Translation)
+    priority = case({code: i for i, code in enumerate(chain)}, value=candidate.language)
+    return (
+        select(candidate.id)
+        .where(candidate.post_id == Post.id, candidate.language.in_(chain))
+        .order_by(priority, candidate.id)
+        .limit(1)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+
+def _posts_query(lang: Optional[str]):
+    """翻訳を含めて記事を読み込むSELECT (lang を指定した場合はその言語の翻訳1件だけ)"""
+    if lang:
+        # 記事1件につき最適な翻訳1件だけを外部結合し、translations に読み込む
+        return (
+            select(Post)
+            .outerjoin(Translation, Translation.id == _best_translation_id(language_fallback_chain(lang)))
+            .options(contains_eager(Post.translations))
+            .execution_options(populate_existing=True)
+        )
     # N+1問題を防ぐため、Translationもまとめてロードする
-    stmt = select(Post).options(selectinload(Post.translations)).order_by(Post.created_at.desc()).offset(skip).limit(limit)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    return select(Post).options(selectinload(Post.translations))
+
+async def get_posts_by_ids(db: AsyncSession, post_ids: list[int], lang: Optional[str] = None) -> dict[int, Post]:
+    """指定したIDの記事を翻訳を含めて取得する ({記事ID: 記事}、存在しないIDは含まれない)"""
+    if not post_ids:
+        return {}
+    result = await db.execute(_posts_query(lang).where(Post.id.in_(post_ids), Post.status == POST_STATUS_PUBLISHED))
+    return {post.id: post for post in result.unique().scalars().all()}
+
+def _feed_page(stmt, skip: int, limit: int, cursor: Optional[str]):
+    """
+    記事一覧のSELECTに公開中の記事の絞り込み・新しい順の並び・ページ指定を加える (次ページの有無を判定するため1件多く取得する)
+    cursor を指定した場合はキーセット方式 ((created_at, id) がカーソルより古いもの) で絞り込みます。
+    """
+    stmt = stmt.where(Post.status == POST_STATUS_PUBLISHED).order_by(Post.created_at.desc(), Post.id.desc())
+    if cursor:
+        try:
+            created_at, post_id = decode_cursor(cursor)
+            created_at = datetime.datetime.fromisoformat(created_at)
+            if not isinstance(post_id, int):
+                raise ValueError(post_id)
+        except (TypeError, ValueError) as e:
+            raise InvalidCursor("Invalid cursor") from e
+        stmt = stmt.where(or_(
+            Post.created_at < created_at,
+            and_(Post.created_at == created_at, Post.id < post_id),
+        ))
+    else:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit + 1)
+
+async def get_posts(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, lang: Optional[str] = None):
+    """
+    記事一覧を新しい順に取得し、(記事リスト, 次ページのカーソル) を返す
+    cursor を指定した場合はキーセット方式 ((created_at, id) がカーソルより古いもの) で取得するため、
+    深いページでもOFFSETのように遅くなりません。次ページがない場合のカーソルはNoneです。
+    lang を指定した場合は、その言語 (なければフォールバック順の言語) の翻訳1件だけをSQLで絞り込んで読み込みます。
+    """
+    result = await db.execute(_feed_page(_posts_query(lang), skip, limit, cursor))
+    posts = result.unique().scalars().all()
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        if posts:
+            next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+    return posts, next_cursor
+
+_POST_COLUMNS = (Post.id, Post.shop_id, Post.original_text, Post.image_path, Post.image_variants, Post.created_at)
+
+def _post_dict(row, translations: list[dict]) -> dict:
+    # キーの順序は PostResponse のフィールド順に合わせる (通常のパスと同じJSONにするため)
+    return {
+        "original_text": row.original_text,
+        "id": row.id,
+        "shop_id": row.shop_id,
+        "image_path": row.image_path,
+        "image_variants": row.image_variants,
+        "created_at": row.created_at,
+        "translations": translations,
+    }
+
+async def get_post_rows(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, lang: Optional[str] = None):
+    """
+    get_posts と同じ記事一覧を、ORMのオブジェクトを作らずにカラムの値だけで取得し、
+    (PostResponse と同じ形の辞書のリスト, 次ページのカーソル) を返す (一覧APIの高速パス用)
+    """
+    if lang:
+        # 記事ごとに最適な翻訳1件を外部結合し、1回のクエリで取得する
+        stmt = select(*_POST_COLUMNS, Translation.language, Translation.translated_content).outerjoin(
+            Translation, Translation.id == _best_translation_id(language_fallback_chain(lang))
+        )
+    else:
+        stmt = select(*_POST_COLUMNS)
+    rows = (await db.execute(_feed_page(stmt, skip, limit, cursor))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    if lang:
+        posts = [
+            _post_dict(row, [{"language": row.language, "translated_content": row.translated_content}] if row.language else [])
+            for row in rows
+        ]
+        return posts, next_cursor
+
+    translations: dict[int, list[dict]] = {row.id: [] for row in rows}
+    if translations:
+        result = await db.execute(
+            select(Translation.post_id, Translation.language, Translation.translated_content)
+            .where(Translation.post_id.in_(list(translations)))
+            .order_by(Translation.post_id, Translation.id)
+        )
+        for post_id, language, content in result.all():
+            translations[post_id].append({"language": language, "translated_content": content})
+    return [_post_dict(row, translations[row.id]) for row in rows], next_cursor
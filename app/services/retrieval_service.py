@@ -0,0 +1,209 @@
+import asyncio
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict, deque
+from typing import Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.models import POST_STATUS_PUBLISHED, Post, Shop
+
+# チャットのプロンプトに含める店舗数
+CHAT_CONTEXT_TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", "10"))
+# 店舗ごとに検索対象へ含める最近の投稿数
+RETRIEVAL_POSTS_PER_SHOP = int(os.getenv("RETRIEVAL_POSTS_PER_SHOP", "5"))
+# インデックスをDBから作り直す間隔 (秒)
+# ワーカープロセスが複数ある場合、他プロセスでの更新はこの間隔で反映されます
+RETRIEVAL_REFRESH_SECONDS = int(os.getenv("RETRIEVAL_REFRESH_SECONDS", "300"))
+
+# 英数字の単語 / 日中韓の文字 (かな・漢字・ハングル) の連続
+_WORD_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uac00-\ud7af]+")
+_CJK_RE = re.compile(r"[^0-9a-z]")
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """
+    検索用のトークン分割
+    英数字は単語単位、日本語・中国語・韓国語は分かち書きがないため文字bigramに分割します
+    """
+    if not text:
+        return []
+    tokens = []
+    # 全角英数字・半角カナを正規化してから分割する
+    for word in _WORD_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+class BM25Index:
+    """
+    BM25によるシンプルな転置インデックス
+    文書の追加・削除は差分で反映されます
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict) # term -> {doc_id: tf}
+        self._doc_terms: dict[int, Counter] = {}
+        self._doc_lengths: dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def clear(self):
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._total_length = 0
+
+    def add(self, doc_id: int, tokens: Iterable[str]):
+        """文書を追加する (既にある場合は置き換え)"""
+        self.remove(doc_id)
+        terms = Counter(tokens)
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def remove(self, doc_id: int):
+        """文書を削除する"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            docs = self._postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self._postings[term]
+
+    def search(self, tokens: Iterable[str], k: int) -> list[tuple[int, float]]:
+        """スコアの高い順に (doc_id, score) を最大k件返す"""
+        n = len(self._doc_terms)
+        if n == 0:
+            return []
+        avg_length = self._total_length / n
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokens):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+# 店舗単位の検索インデックス (店舗情報 + 最近の投稿・翻訳文)
+_index = BM25Index()
+_shops: dict[int, dict] = {} # shop_id -> 検索対象の店舗情報 (セッションに依存しないようdictで保持)
+_post_texts: dict[int, deque] = defaultdict(lambda: deque(maxlen=RETRIEVAL_POSTS_PER_SHOP))
+_loaded_at: Optional[float] = None
+_lock = asyncio.Lock()
+
+SHOP_FIELDS = ("name", "category", "description", "location")
+
+def _shop_dict(shop: Shop) -> dict:
+    return {field: getattr(shop, field) for field in SHOP_FIELDS}
+
+def _reindex(shop_id: int):
+    shop = _shops.get(shop_id)
+    if shop is None:
+        _index.remove(shop_id)
+        return
+    tokens = []
+    for text in list(shop.values()) + list(_post_texts[shop_id]):
+        tokens.extend(tokenize(text))
+    _index.add(shop_id, tokens)
+
+def _post_text(post: Post) -> str:
+    return "\n".join([post.original_text] + [t.translated_content for t in post.translations])
+
+async def ensure_loaded(db: AsyncSession):
+    """
+    インデックスが未作成、または古くなっている場合にDBから作り直す
+    """
+    global _loaded_at
+    if _loaded_at is not None and time.monotonic() - _loaded_at < RETRIEVAL_REFRESH_SECONDS:
+        return
+    async with _lock:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < RETRIEVAL_REFRESH_SECONDS:
+            return
+        shops = (await db.execute(select(Shop))).scalars().all()
+        # 最近の投稿を新しい順に取得し、店舗ごとに上限件数まで使う
+        recent_limit = max(len(shops), 1) * RETRIEVAL_POSTS_PER_SHOP
+        posts = (await db.execute(
+            select(Post)
+            .options(selectinload(Post.translations))
+            .where(Post.status == POST_STATUS_PUBLISHED)
+            .order_by(Post.created_at.desc())
+            .limit(recent_limit)
+        )).scalars().all()
+
+        _shops.clear()
+        _post_texts.clear()
+        _index.clear()
+        for shop in shops:
+            _shops[shop.id] = _shop_dict(shop)
+        for post in reversed(posts): # 古い順に積み、新しいものが残るようにする
+            _post_texts[post.shop_id].append(_post_text(post))
+        for shop_id in _shops:
+            _reindex(shop_id)
+        _loaded_at = time.monotonic()
+
+def invalidate():
+    """次回の検索時にDBから作り直すようにする"""
+    global _loaded_at
+    _loaded_at = None
+
+def upsert_shop(shop: Shop):
+    """店舗の作成・更新をインデックスに反映する"""
+    if _loaded_at is None:
+        return # 未作成の場合は初回ロード時にまとめて読み込まれる
+    _shops[shop.id] = _shop_dict(shop)
+    _reindex(shop.id)
+
+def remove_shop(shop_id: int):
+    """店舗の削除をインデックスに反映する"""
+    if _loaded_at is None:
+        return
+    _shops.pop(shop_id, None)
+    _post_texts.pop(shop_id, None)
+    _index.remove(shop_id)
+
+def add_post(post: Post):
+    """新しい投稿 (翻訳を含む) を店舗の検索対象テキストに追加する"""
+    if _loaded_at is None or post.shop_id not in _shops:
+        return
+    _post_texts[post.shop_id].append(_post_text(post))
+    _reindex(post.shop_id)
+
+def search_shop_ids(query: str, k: int = CHAT_CONTEXT_TOP_K) -> list[int]:
+    """
+    質問に関連する店舗IDを最大k件返す
+    店舗数がk件以下の場合や、何もヒットしない場合は登録順に返します
+    """
+    if len(_shops) <= k:
+        return sorted(_shops)
+    hits = [shop_id for shop_id, _ in _index.search(tokenize(query), k)]
+    if len(hits) < k:
+        # 足りない分は登録順で補い、一般的な質問にも答えられるようにする
+        hit_ids = set(hits)
+        for shop_id in sorted(_shops):
+            if len(hits) >= k:
+                break
+            if shop_id not in hit_ids:
+                hits.append(shop_id)
+    return hits
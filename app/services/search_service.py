@@ -0,0 +1,145 @@
+import os
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.languages import SOURCE_LANGUAGE
+from app.models import POST_STATUS_PUBLISHED
+from app.services import post_service
+
+# 記事の全文検索 (GET /posts/search)
+# インデックスはマイグレーション v004 で作成し、記事・翻訳の追加時にはDB側 (トリガー / FULLTEXT) で自動的に更新されます
+# - SQLite: FTS5 (trigram)。3文字未満の語は trigram で引けないため LIKE で絞り込みます
+# - MySQL:  FULLTEXT (ngram, 既定の ngram_token_size=2)。2文字未満の語は LIKE で絞り込みます
+
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "80"))
+MAX_QUERY_TERMS = 8
+MAX_TERM_CHARS = 64
+
+# 検索対象 (テーブル, 本文カラム, 記事IDの式, 言語の式, 記事の公開状態を参照するためのJOIN, 公開状態の式)
+# 記事の元の投稿文 (posts.original_text) は日本語 (SOURCE_LANGUAGE) の文書として扱う
+_SOURCES = {
+    "translations": ("translations", "translated_content", "b.post_id", "b.language", " JOIN posts p ON p.id = b.post_id", "p.status"),
+    "posts": ("posts", "original_text", "b.id", f"'{SOURCE_LANGUAGE.code}'", "", "b.status"),
+}
+_SQLITE_FTS = {"translations": "translations_fts", "posts": "posts_fts"}
+# 全文インデックスで引ける語の最小文字数
+_MIN_INDEXED_CHARS = {"sqlite": 3, "mysql": 2}
+
+class InvalidSearchQuery(ValueError):
+    """検索語が空の場合の例外"""
+
+@dataclass
+class SearchHit:
+    post_id: int
+    language: str # 一致した文書の言語
+    score: float # 大きいほど関連度が高い
+    content: str
+
+def parse_terms(query: str) -> list[str]:
+    """検索文字列を語に分ける (空白区切り、全角半角を統一、重複を除く)"""
+    normalized = unicodedata.normalize("NFKC", query).replace('"', " ")
+    terms = [term[:MAX_TERM_CHARS] for term in normalized.split()]
+    terms = list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+    if not terms:
+        raise InvalidSearchQuery("Search query is empty")
+    return terms
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _source_query(dialect: str, source: str, terms: list[str], lang: Optional[str], limit: int):
+    """1種類の文書 (翻訳 / 元の投稿文) から一致するものを関連度順に取り出すSQLとパラメータ"""
+    table, column, post_id, language, join, status = _SOURCES[source]
+    min_chars = _MIN_INDEXED_CHARS.get(dialect)
+    indexed = [term for term in terms if min_chars is not None and len(term) >= min_chars]
+    params = {"limit": limit, "published": POST_STATUS_PUBLISHED}
+    where = [f"{status} = :published"] # 公開前の下書きは検索しない
+    for i, term in enumerate(term for term in terms if term not in indexed):
+        where.append(f"b.{column} LIKE :like{i} ESCAPE '\\'")
+        params[f"like{i}"] = f"%{_escape_like(term)}%"
+    if lang and source == "translations":
+        where.append("b.language = :lang")
+        params["lang"] = lang
+
+    if not indexed:
+        # 全文インデックスを使えない場合は新しい文書から順に返す (関連度は0)
+        sql = f"SELECT {post_id} AS post_id, {language} AS language, 0.0 AS score, b.{column} AS content FROM {table} b"
+        order = "b.id DESC"
+    elif dialect == "sqlite":
+        fts = _SQLITE_FTS[source]
+        # bm25() は小さいほど関連度が高いため符号を反転する
+        sql = (
+            f"SELECT {post_id} AS post_id, {language} AS language, -bm25({fts}) AS score, b.{column} AS content "
+            f"FROM {fts} JOIN {table} b ON b.id = {fts}.rowid"
+        )
+        where.insert(0, f"{fts} MATCH :match")
+        params["match"] = " ".join('"' + term + '"' for term in indexed)
+        order = "score DESC"
+    else:
+        match = f"MATCH(b.{column}) AGAINST (:match IN BOOLEAN MODE)"
+        sql = f"SELECT {post_id} AS post_id, {language} AS language, {match} AS score, b.{column} AS content FROM {table} b"
+        where.insert(0, match)
+        params["match"] = " ".join('+"' + term + '"' for term in indexed)
+        order = "score DESC"
+
+    sql += join + " WHERE " + " AND ".join(where)
+    return text(f"{sql} ORDER BY {order} LIMIT :limit"), params
+
+def make_snippet(content: str, terms: list[str], width: int = SEARCH_SNIPPET_CHARS) -> str:
+    """最初に一致した語の周辺 width 文字を切り出す"""
+    lowered = content.lower()
+    positions = [p for p in (lowered.find(term.lower()) for term in terms) if p >= 0]
+    if len(content) <= width:
+        return content
+    start = max(min(positions, default=0) - width // 3, 0)
+    end = min(start + width, len(content))
+    start = max(end - width, 0)
+    return ("…" if start > 0 else "") + content[start:end] + ("…" if end < len(content) else "")
+
+async def search_hits(db: AsyncSession, query: str, lang: Optional[str] = None, limit: int = 20) -> tuple[list[str], list[SearchHit]]:
+    """
+    検索語に一致する記事を関連度順に返す (検索語, 記事ごとに最も関連度の高い文書)
+    lang を指定した場合はその言語の翻訳 (日本語の場合は元の投稿文も) だけを検索します
+    """
+    terms = parse_terms(query)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    dialect = db.get_bind().dialect.name
+
+    sources = ["translations"]
+    if lang is None or lang == SOURCE_LANGUAGE.code:
+        sources.append("posts")
+    best: dict[int, SearchHit] = {}
+    for source in sources:
+        # 1つの記事に複数の言語の文書が一致するため、多めに取り出してから記事ごとにまとめる
+        stmt, params = _source_query(dialect, source, terms, lang, limit * 3)
+        for row in (await db.execute(stmt, params)).all():
+            hit = SearchHit(post_id=row.post_id, language=row.language, score=float(row.score or 0), content=row.content)
+            current = best.get(hit.post_id)
+            if current is None or hit.score > current.score:
+                best[hit.post_id] = hit
+
+    hits = sorted(best.values(), key=lambda hit: (hit.score, hit.post_id), reverse=True)
+    return terms, hits[:limit]
+
+async def search_posts(db: AsyncSession, query: str, lang: Optional[str] = None, limit: int = 20) -> list[dict]:
+    """
+    記事を全文検索し、関連度順に記事 (翻訳を含む) と一致箇所の抜粋を返す
+    記事の翻訳は GET /posts と同じく lang (とフォールバック順) で絞り込みます
+    """
+    terms, hits = await search_hits(db, query, lang, limit)
+    posts = await post_service.get_posts_by_ids(db, [hit.post_id for hit in hits], lang)
+    return [
+        {
+            "post": posts[hit.post_id],
+            "score": hit.score,
+            "matched_language": hit.language,
+            "snippet": make_snippet(hit.content, terms),
+        }
+        for hit in hits
+        if hit.post_id in posts
+    ]
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Shop
+
+# スナップショットの最大寿命 (秒)
+# ワーカープロセスが複数ある場合、他プロセスでの店舗更新はこの間隔で反映されます
+SHOP_CONTEXT_MAX_AGE_SECONDS = int(os.getenv("SHOP_CONTEXT_MAX_AGE_SECONDS", "300"))
+
+@dataclass
+class ShopContextSnapshot:
+    """
+    チャット用に整形済みの店舗情報
+    店舗が変更されるたびに世代 (generation) が進み、次の利用時に作り直されます
+    """
+    generation: int
+    built_at: datetime
+    build_ms: float
+    lines: dict[int, str] = field(default_factory=dict) # shop_id -> プロンプト用の1行
+    created: float = field(default_factory=time.monotonic)
+
+    def render(self, shop_ids: Iterable[int]) -> str:
+        """指定した店舗の行を連結してプロンプト用の文字列にする"""
+        return "".join(self.lines[shop_id] for shop_id in shop_ids if shop_id in self.lines)
+
+_generation = 0
+_snapshot: Optional[ShopContextSnapshot] = None
+_lock = asyncio.Lock()
+rebuild_count = 0
+
+def render_line(shop: Shop) -> str:
+    return f"- ID: {shop.id}, Name: {shop.name}, Category: {shop.category}, Description: {shop.description}, Location: {shop.location}, Map URL: {shop.map_url}, Reservation URL: {shop.reservation_url}\n"
+
+def bump_generation():
+    """店舗の作成・更新・削除時に呼び出し、スナップショットを古くする"""
+    global _generation
+    _generation += 1
+
+def current_generation() -> int:
+    return _generation
+
+def _is_fresh(snapshot: Optional[ShopContextSnapshot]) -> bool:
+    return (
+        snapshot is not None
+        and snapshot.generation == _generation
+        and time.monotonic() - snapshot.created < SHOP_CONTEXT_MAX_AGE_SECONDS
+    )
+
+async def get_snapshot(db: AsyncSession) -> ShopContextSnapshot:
+    """
+    最新世代のスナップショットを返す
+    世代が変わっていなければDBにはアクセスしません
+    """
+    global _snapshot, rebuild_count
+    if _is_fresh(_snapshot):
+        return _snapshot
+    async with _lock:
+        # ロック待ちの間に他のリクエストが作り直していれば、それを使う
+        if _is_fresh(_snapshot):
+            return _snapshot
+        generation = _generation
+        started = time.perf_counter()
+        shops = (await db.execute(select(Shop).order_by(Shop.id))).scalars().all()
+        lines = {shop.id: render_line(shop) for shop in shops}
+        _snapshot = ShopContextSnapshot(
+            generation=generation,
+            built_at=datetime.utcnow(),
+            build_ms=(time.perf_counter() - started) * 1000,
+            lines=lines,
+        )
+        rebuild_count += 1
+        return _snapshot
+
+def status() -> dict:
+    """現在のスナップショットの状態"""
+    return {
+        "generation": _generation,
+        "snapshot_generation": _snapshot.generation if _snapshot else None,
+        "built_at": _snapshot.built_at if _snapshot else None,
+        "build_ms": _snapshot.build_ms if _snapshot else None,
+        "shop_count": len(_snapshot.lines) if _snapshot else 0,
+        "rebuild_count": rebuild_count,
+    }
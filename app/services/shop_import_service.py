@@ -0,0 +1,293 @@
+import codecs
+import csv
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Shop
+from app.schemas.shop import ShopCreate, ShopImportError, ShopImportResult
+from app.services import retrieval_service, shop_context_service
+
+# 1回のSQL (executemany) でまとめて書き込む行数
+SHOP_IMPORT_BATCH_SIZE = int(os.getenv("SHOP_IMPORT_BATCH_SIZE", "500"))
+# 1回のインポートで受け付ける最大行数 (全体を1トランザクションで実行するため)
+SHOP_IMPORT_MAX_ROWS = int(os.getenv("SHOP_IMPORT_MAX_ROWS", "10000"))
+# レスポンスに含めるエラー行の最大数
+SHOP_IMPORT_MAX_ERRORS = int(os.getenv("SHOP_IMPORT_MAX_ERRORS", "1000"))
+
+# Content-Type からファイル形式を判定するための対応表
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/x-jsonlines": "jsonl",
+}
+
+# 文字列カラムの最大長 (DBで切り捨て・エラーになる前に行単位で弾く)
+_COLUMN_LIMITS = {
+    column.name: column.type.length
+    for column in Shop.__table__.columns
+    if getattr(column.type, "length", None)
+}
+
+class InvalidImportFile(Exception):
+    """ファイル全体が読み込めない場合の例外 (ヘッダー不正、文字コード不正など)"""
+
+class ImportTooLarge(Exception):
+    """行数が上限を超えた場合の例外"""
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    """Content-Type から "csv" / "jsonl" を判定する (判定できなければNone)"""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return CONTENT_TYPE_FORMATS.get(media_type)
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """
+    リクエストボディをチャンク単位で受け取り、(行番号, 行) を順に返す
+    ファイル全体をメモリに載せないため、行の途中で切れたチャンクは次のチャンクとつなげます
+    """
+    # Excelが付けるBOMは取り除く
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    line_no = 0
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                line_no += 1
+                yield line_no, line + "\n"
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise InvalidImportFile(f"File is not valid UTF-8 (line {line_no + 1})") from e
+    if pending:
+        yield line_no + 1, pending
+
+# CSVの1レコードとして読む最大行数 (引用符が閉じていない場合に残り全体を1レコードとして抱え込まないため)
+_MAX_RECORD_LINES = 200
+
+def _read_record(lines: list[str]) -> Optional[tuple[int, object]]:
+    """
+    先頭の行から csv.reader で1レコードを読み、(使った行数, 値のリスト) を返す
+    引用符の中で行が足りなくなった場合 (次の行に続くレコード) はNone、読めないレコードは値の代わりに csv.Error を返します
+    """
+    used = 0
+    exhausted = False
+
+    def feed():
+        nonlocal used, exhausted
+        for line in lines:
+            used += 1
+            yield line
+        exhausted = True
+
+    try:
+        values = next(csv.reader(feed()))
+    except csv.Error as e:
+        return (used, e) if not exhausted else None
+    return None if exhausted else (used, values)
+
+async def _iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """
+    CSVを1レコードずつ (開始行番号, 値のリスト) にして返す (読めないレコードは値の代わりに csv.Error)
+    レコードの区切りは csv.reader に任せ、引用符の中の改行 (説明文など) で行が足りない場合は次の行を待ちます。
+    """
+    pending: list[str] = []
+    record_line = 0
+
+    def take() -> Optional[tuple[int, object]]:
+        nonlocal pending, record_line
+        parsed = _read_record(pending)
+        if parsed is None:
+            return None
+        used, values = parsed
+        row = record_line
+        pending = pending[used:]
+        record_line += used
+        return row, values
+
+    async for line_no, line in _iter_lines(chunks):
+        if not pending:
+            record_line = line_no
+        pending.append(line)
+        while pending and (record := take()) is not None:
+            yield record
+        if len(pending) > _MAX_RECORD_LINES:
+            yield record_line, csv.Error(f"Record is longer than {_MAX_RECORD_LINES} lines (unterminated quoted field?)")
+            pending = []
+
+    if pending:
+        # 最後の行に改行がない場合を補い、それでも読めなければ引用符が閉じていない
+        pending[-1] = pending[-1].rstrip("\r\n") + "\n"
+        if (record := take()) is not None:
+            yield record
+        else:
+            yield record_line, csv.Error("Unterminated quoted field")
+
+async def _iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """
+    CSVを1レコードずつ辞書にして返す (1行目はヘッダー。読めないレコードは値の代わりに csv.Error)
+    ヘッダーに ShopCreate にない列がある場合は、列名の誤りで値が黙って捨てられないようファイル全体をエラーにします。
+    """
+    header: Optional[list[str]] = None
+    async for record_line, values in _iter_csv_rows(chunks):
+        if header is None:
+            if isinstance(values, csv.Error):
+                raise InvalidImportFile(f"Malformed CSV header: {values}")
+            if not any(value.strip() for value in values):
+                continue
+            header = [value.strip().lower() for value in values]
+            if "name" not in header:
+                raise InvalidImportFile("CSV header must contain a 'name' column")
+            unknown = [key for key in header if key and key not in ShopCreate.model_fields]
+            if unknown:
+                raise InvalidImportFile(
+                    f"Unknown CSV columns: {', '.join(unknown)} (expected: {', '.join(ShopCreate.model_fields)})"
+                )
+            continue
+        if isinstance(values, csv.Error):
+            yield record_line, values
+            continue
+        if not any(value.strip() for value in values):
+            continue
+        if len(values) > len(header):
+            yield record_line, csv.Error(f"Expected at most {len(header)} fields, got {len(values)}")
+            continue
+        # 空のセルは「指定なし」として扱う (更新時に既存の値を消さない)
+        yield record_line, {
+            key: value.strip()
+            for key, value in zip(header, values)
+            if key and value.strip()
+        }
+
+    if header is None:
+        raise InvalidImportFile("CSV header is missing")
+
+async def _iter_jsonl_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """JSON Linesを1行ずつ読み込んで返す (JSONとして読めない行はその例外を値として返す)"""
+    async for line_no, line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+def _validate(record: object) -> ShopCreate:
+    """1行分のデータを ShopCreate として検証する (不正な場合はエラーメッセージ付きで ValueError)"""
+    if isinstance(record, csv.Error):
+        raise ValueError(f"Malformed CSV record: {record}")
+    if isinstance(record, ValueError):
+        raise ValueError(f"Invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    unknown = [key for key in record if key not in ShopCreate.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    try:
+        shop = ShopCreate(**record)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+        ))
+    shop.name = shop.name.strip()
+    if not shop.name:
+        raise ValueError("name: must not be empty")
+    for key, value in shop.model_dump(exclude_none=True).items():
+        limit = _COLUMN_LIMITS.get(key)
+        if limit and len(value) > limit:
+            raise ValueError(f"{key}: must be at most {limit} characters")
+    return shop
+
+def _records(fmt: str, chunks: AsyncIterator[bytes]):
+    return _iter_csv_records(chunks) if fmt == "csv" else _iter_jsonl_records(chunks)
+
+async def import_shops(db: AsyncSession, chunks: AsyncIterator[bytes], fmt: str) -> ShopImportResult:
+    """
+    店舗をCSV / JSON Linesから一括登録する
+    店舗名を自然キーとして、既にある店舗は更新 (ファイルにある項目だけ)、ない店舗は新規作成します。
+    同じ店舗名の行が複数ある場合は後の行の内容で上書きし、2行目以降は duplicates として数えます。
+    SHOP_IMPORT_BATCH_SIZE 行ずつまとめてINSERT / UPDATEし、全体を1つのトランザクションで確定します。
+    検証エラーの行は取り込まずにスキップし、行番号付きで結果に含めます。
+    """
+    result = ShopImportResult(format=fmt, total=0, inserted=0, updated=0, failed=0)
+    # 既に数えた店舗名 (同じ店舗の2行目以降は duplicates として数え、inserted / updated は店舗ごとに1回だけ数える)
+    counted: set[str] = set()
+
+    def add_error(row: int, name: Optional[str], message: str):
+        result.failed += 1
+        if len(result.errors) < SHOP_IMPORT_MAX_ERRORS:
+            result.errors.append(ShopImportError(row=row, name=name, error=message))
+        else:
+            result.errors_truncated = True
+
+    async def flush(batch: list[tuple[int, ShopCreate]]):
+        # 同じ名前の店舗をまとめて1回のSELECTで調べ、INSERTとUPDATEに振り分ける
+        names = {shop.name for _, shop in batch}
+        rows = await db.execute(select(Shop.id, Shop.name).where(Shop.name.in_(names)))
+        existing: dict[str, list[int]] = defaultdict(list)
+        for shop_id, name in rows:
+            existing[name].append(shop_id)
+
+        inserts: dict[str, dict] = {}
+        updates: dict[int, dict] = {}
+        for row, shop in batch:
+            ids = existing.get(shop.name, [])
+            if len(ids) > 1:
+                add_error(row, shop.name, "Multiple shops already share this name")
+                continue
+            if ids:
+                updates.setdefault(ids[0], {"id": ids[0]}).update(shop.model_dump(exclude_unset=True))
+            elif shop.name in inserts:
+                # 同じバッチ内で重複した店舗は後の行の内容で上書きする
+                inserts[shop.name].update(shop.model_dump(exclude_unset=True))
+            else:
+                inserts[shop.name] = shop.model_dump()
+            if shop.name in counted:
+                result.duplicates += 1
+            else:
+                counted.add(shop.name)
+                if ids:
+                    result.updated += 1
+                else:
+                    result.inserted += 1
+
+        if inserts:
+            await db.execute(insert(Shop), list(inserts.values()))
+        if updates:
+            await db.execute(update(Shop), list(updates.values()))
+
+    batch: list[tuple[int, ShopCreate]] = []
+    try:
+        async for row, record in _records(fmt, chunks):
+            result.total += 1
+            if result.total > SHOP_IMPORT_MAX_ROWS:
+                raise ImportTooLarge(f"Import is limited to {SHOP_IMPORT_MAX_ROWS} rows")
+            try:
+                batch.append((row, _validate(record)))
+            except ValueError as e:
+                name = record.get("name") if isinstance(record, dict) else None
+                add_error(row, name if isinstance(name, str) else None, str(e))
+                continue
+            if len(batch) >= SHOP_IMPORT_BATCH_SIZE:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+        await db.commit()
+    except BaseException:
+        await db.rollback() # 途中までの書き込みは全て取り消す
+        raise
+
+    if result.inserted or result.updated:
+        # チャット用の検索インデックスと店舗情報スナップショットを作り直す
+        retrieval_service.invalidate()
+        shop_context_service.bump_generation()
+    return result
@@ -1,8 +1,11 @@
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
+from sqlalchemy import delete, func, literal, null, union_all
 from app.models import Shop
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
 from app.schemas.shop import ShopCreate, ShopUpdate
+from app.services import feed_cache_service, retrieval_service, shop_context_service
 
 async def get_shop(db: AsyncSession, shop_id: int):
     """
@@ -11,12 +14,118 @@ async def get_shop(db: AsyncSession, shop_id: int):
     result = await db.execute(select(Shop).filter(Shop.id == shop_id))
     return result.scalars().first()
 
-async def get_shops(db: AsyncSession, skip: int = 0, limit: int = 100):
+def _filters(location: Optional[str] = None, name_prefix: Optional[str] = None) -> list:
+    """カテゴリ以外の絞り込み条件 (場所の部分一致・店舗名の前方一致)"""
+    conditions = []
+    if location:
+        conditions.append(Shop.location.contains(location, autoescape=True))
+    if name_prefix:
+        # LIKE 'xxx%' はSQLiteでは ix_shops_name を使えないため、範囲条件で前方一致を表す
+        conditions.append(Shop.name >= name_prefix)
+        conditions.append(Shop.name < name_prefix + "\U0010ffff")
+    return conditions
+
+def _page(stmt, skip: int, cursor: Optional[str]):
+    """ID順のページ指定 (cursor を指定した場合はキーセット方式で、IDがカーソルより大きいもの)"""
+    if cursor:
+        try:
+            (last_id,) = decode_cursor(cursor)
+            if not isinstance(last_id, int):
+                raise ValueError(last_id)
+        except ValueError as e:
+            raise InvalidCursor("Invalid cursor") from e
+        return stmt.where(Shop.id > last_id)
+    return stmt.offset(skip)
+
+def _next_cursor(shops: list, limit: int):
+    """1件多く取得した結果から (そのページの店舗, 次ページのカーソル) を返す"""
+    if len(shops) > limit:
+        shops = shops[:limit]
+        if shops:
+            return shops, encode_cursor(shops[-1].id)
+    return shops, None
+
+async def get_shops(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+):
     """
-    店舗一覧を取得する (ページネーション対応)
+    店舗一覧をID順に取得し、(店舗リスト, 次ページのカーソル) を返す (ページネーション対応)
+    cursor を指定した場合はキーセット方式 (IDがカーソルより大きいもの) で取得します。
+    次ページがない場合のカーソルはNoneです。
+    category (完全一致)・location (部分一致)・name_prefix (前方一致) で絞り込めます。
+    """
+    stmt = select(Shop).where(*_filters(location, name_prefix)).order_by(Shop.id)
+    if category:
+        stmt = stmt.where(Shop.category == category)
+    stmt = _page(stmt, skip, cursor)
+    # 次ページの有無を判定するため1件多く取得する
+    result = await db.execute(stmt.limit(limit + 1))
+    return _next_cursor(result.scalars().all(), limit)
+
+# 選択するカラム (順序は ShopResponse のフィールド順に合わせる)
+_SHOP_COLUMNS = [Shop.name, Shop.description, Shop.location, Shop.category, Shop.map_url, Shop.reservation_url, Shop.id]
+
+async def get_shop_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+):
     """
-    result = await db.execute(select(Shop).offset(skip).limit(limit))
-    return result.scalars().all()
+    get_shops と同じ店舗一覧を、ORMのオブジェクトを作らずにカラムの値だけで取得し、
+    (ShopResponse と同じ形の辞書のリスト, 次ページのカーソル) を返す (一覧APIの高速パス用)
+    """
+    stmt = select(*_SHOP_COLUMNS).where(*_filters(location, name_prefix)).order_by(Shop.id)
+    if category:
+        stmt = stmt.where(Shop.category == category)
+    result = await db.execute(_page(stmt, skip, cursor).limit(limit + 1))
+    rows, next_cursor = _next_cursor(result.all(), limit)
+    return [row._asdict() for row in rows], next_cursor
+
+async def get_shop_directory(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+):
+    """
+    店舗一覧 (get_shops と同じ絞り込み) と、カテゴリごとの店舗数を1回のクエリで取得し、
+    (店舗リスト, カテゴリごとの店舗数, 絞り込み後の店舗数, 次ページのカーソル) を返す
+    カテゴリごとの店舗数は category 以外の条件で数えるため、他のカテゴリに切り替えた場合の件数も分かります。
+    """
+    filters = _filters(location, name_prefix)
+    page = select(literal("shop").label("kind"), *_SHOP_COLUMNS, null().label("shop_count")).where(*filters)
+    if category:
+        page = page.where(Shop.category == category)
+    page = _page(page.order_by(Shop.id), skip, cursor).limit(limit + 1).subquery()
+    # 店舗の行とカテゴリ集計の行を UNION ALL でまとめて、DBとの往復を1回にする
+    facets = (
+        select(
+            literal("facet"), null(), null(), null(), Shop.category, null(), null(), null(),
+            func.count().label("shop_count"),
+        )
+        .where(*filters)
+        .group_by(Shop.category)
+    )
+    rows = (await db.execute(union_all(select(page), facets))).all()
+
+    shops = [row for row in rows if row.kind == "shop"]
+    categories = {row.category: row.shop_count for row in rows if row.kind == "facet"}
+    total = categories.get(category, 0) if category else sum(categories.values())
+    shops, next_cursor = _next_cursor(shops, limit)
+    return shops, categories, total, next_cursor
 
 async def create_shop(db: AsyncSession, shop: ShopCreate):
     """
@@ -26,6 +135,9 @@ async def create_shop(db: AsyncSession, shop: ShopCreate):
     db.add(db_shop)
     await db.commit() # 変更を確定
     await db.refresh(db_shop) # 新しいID等の情報を再取得
+    # チャット用の検索インデックスと店舗情報スナップショットに反映
+    retrieval_service.upsert_shop(db_shop)
+    shop_context_service.bump_generation()
     return db_shop
 
 async def update_shop(db: AsyncSession, shop_id: int, shop_update: ShopUpdate):
@@ -43,6 +155,8 @@ async def update_shop(db: AsyncSession, shop_id: int, shop_update: ShopUpdate):
     
     await db.commit()
     await db.refresh(db_shop)
+    retrieval_service.upsert_shop(db_shop)
+    shop_context_service.bump_generation()
     return db_shop
 
 async def delete_shop(db: AsyncSession, shop_id: int):
@@ -55,4 +169,7 @@ async def delete_shop(db: AsyncSession, shop_id: int):
     
     await db.delete(db_shop)
     await db.commit()
+    retrieval_service.remove_shop(shop_id)
+    shop_context_service.bump_generation()
+    feed_cache_service.invalidate() # 店舗の記事も削除されるため記事一覧のキャッシュを破棄
     return db_shop
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from sqlalchemy import and_, exists, func, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.languages import SOURCE_LANGUAGE, Language
+from app.models import POST_STATUS_PUBLISHED, Post, Translation
+from app.services import ai_service, feed_cache_service
+
+# 1回のGeminiリクエストで翻訳する記事数
+BACKFILL_POSTS_PER_REQUEST = int(os.getenv("BACKFILL_POSTS_PER_REQUEST", "10"))
+# 同時に実行するGeminiリクエスト数
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+
+@dataclass
+class BackfillCheckpoint:
+    """
+    バックフィルの進捗 (JSONファイルに保存し、中断しても続きから再開できる)
+    last_post_id までの記事は処理済みです
+    """
+    languages: list[str]
+    last_post_id: int = 0
+    translated_posts: int = 0
+    written_rows: int = 0
+    failed_post_ids: list[int] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Optional[str], languages: list[Language]) -> "BackfillCheckpoint":
+        codes = sorted(lang.code for lang in languages)
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            # 対象言語が違うチェックポイントは使わない (最初からやり直す)
+            if sorted(data.get("languages", [])) == codes:
+                return cls(**data)
+            print(f"Checkpoint {path} is for languages {data.get('languages')}; starting over")
+        return cls(languages=codes)
+
+    def save(self, path: Optional[str]):
+        if not path:
+            return
+        # 書き込み途中で止まっても壊れないよう、一時ファイルに書いてから置き換える
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+def _missing_any(languages: list[Language]):
+    """対象言語のうち1つでも翻訳がない記事を絞り込む条件"""
+    return or_(*(
+        ~exists().where(and_(Translation.post_id == Post.id, Translation.language == lang.code))
+        for lang in languages
+    ))
+
+async def count_missing(db: AsyncSession, languages: list[Language], after_id: int = 0) -> int:
+    """翻訳が足りない記事の件数"""
+    stmt = select(func.count()).select_from(Post).where(Post.id > after_id, Post.status == POST_STATUS_PUBLISHED, _missing_any(languages))
+    return (await db.execute(stmt)).scalar()
+
+async def _fetch_page(db: AsyncSession, languages: list[Language], after_id: int, limit: int) -> list[Post]:
+    stmt = (
+        select(Post)
+        .options(selectinload(Post.translations))
+        .where(Post.id > after_id, Post.status == POST_STATUS_PUBLISHED, _missing_any(languages)) # 下書きはジョブが翻訳する
+        .order_by(Post.id)
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).scalars().all()
+
+def _source_text(post: Post) -> str:
+    """翻訳元の文章 (AIが生成した日本語の投稿文。なければ店主のコメント)"""
+    for trans in post.translations:
+        if trans.language == SOURCE_LANGUAGE.code:
+            return trans.translated_content
+    return post.original_text
+
+async def _translate_chunk(posts: list[Post], languages: list[Language], semaphore: asyncio.Semaphore) -> dict[int, dict[str, str]]:
+    """記事のまとまりを1回のリクエストで翻訳する (足りない言語だけを依頼する)"""
+    have = {post.id: {trans.language for trans in post.translations} for post in posts}
+    targets = [lang for lang in languages if any(lang.code not in codes for codes in have.values())]
+    async with semaphore:
+        results = await ai_service.translate_posts({post.id: _source_text(post) for post in posts}, targets)
+    # 既にある翻訳は上書きしない
+    return {
+        post_id: {code: content for code, content in translations.items() if code not in have[post_id]}
+        for post_id, translations in results.items()
+    }
+
+async def backfill(
+    db: AsyncSession,
+    languages: list[Language],
+    checkpoint_path: Optional[str] = None,
+    posts_per_request: int = BACKFILL_POSTS_PER_REQUEST,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    max_posts: Optional[int] = None,
+) -> BackfillCheckpoint:
+    """
+    既存の記事のうち、指定言語の翻訳がないものを翻訳して保存する
+    記事ID順に (posts_per_request × concurrency) 件ずつ読み込み、posts_per_request 件ごとに
+    Geminiへ並行してリクエストし、結果をまとめてINSERTします。
+    1ページ処理するごとにコミットしてチェックポイントを保存するため、中断しても続きから再開できます。
+    失敗した記事は failed_post_ids に記録され、チェックポイントを消して再実行すると再度翻訳されます。
+    """
+    checkpoint = BackfillCheckpoint.load(checkpoint_path, languages)
+    semaphore = asyncio.Semaphore(concurrency)
+    page_size = posts_per_request * concurrency
+    remaining = await count_missing(db, languages, checkpoint.last_post_id)
+    print(f"Backfilling {[lang.code for lang in languages]}: {remaining} posts to translate "
+          f"(resuming after post {checkpoint.last_post_id})")
+
+    processed = 0
+    started = time.perf_counter()
+    while max_posts is None or processed < max_posts:
+        limit = page_size if max_posts is None else min(page_size, max_posts - processed)
+        posts = await _fetch_page(db, languages, checkpoint.last_post_id, limit)
+        if not posts:
+            break
+
+        chunks = [posts[i:i + posts_per_request] for i in range(0, len(posts), posts_per_request)]
+        results = await asyncio.gather(
+            *(_translate_chunk(chunk, languages, semaphore) for chunk in chunks),
+            return_exceptions=True,
+        )
+
+        rows = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                print(f"Translation failed for posts {chunk[0].id}-{chunk[-1].id}: {result}")
+                result = {}
+            for post in chunk:
+                translations = result.get(post.id)
+                if not translations:
+                    checkpoint.failed_post_ids.append(post.id)
+                    continue
+                checkpoint.translated_posts += 1
+                rows.extend(
+                    {"post_id": post.id, "language": code, "translated_content": content}
+                    for code, content in translations.items()
+                )
+        if rows:
+            await db.execute(insert(Translation), rows)
+        await db.commit()
+        # 同じプロセスの記事一覧キャッシュを破棄 (APIサーバーのキャッシュはTTLで反映される)
+        feed_cache_service.invalidate()
+
+        processed += len(posts)
+        checkpoint.last_post_id = posts[-1].id
+        checkpoint.written_rows += len(rows)
+        checkpoint.save(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        print(f"  {processed}/{remaining} posts, {checkpoint.written_rows} rows written, "
+              f"{len(checkpoint.failed_post_ids)} failed ({elapsed:.1f}s)")
+
+    return checkpoint
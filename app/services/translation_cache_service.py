@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.cache import LRUCache
+from app.database import AsyncSessionLocal
+from app.models import TranslationCacheEntry
+from app.services import ai_service
+
+# プロセス内キャッシュの件数
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "256"))
+# DBキャッシュの保持期間と最大件数
+TRANSLATION_CACHE_TTL_DAYS = int(os.getenv("TRANSLATION_CACHE_TTL_DAYS", "30"))
+TRANSLATION_CACHE_MAX_ROWS = int(os.getenv("TRANSLATION_CACHE_MAX_ROWS", "10000"))
+# 何回書き込むごとにDBキャッシュの掃除を行うか
+_PRUNE_EVERY = 100
+
+_memory = LRUCache(maxsize=TRANSLATION_CACHE_SIZE)
+# 同じキーの計算中リクエスト (ダブルクリック等の同時再送を1回のAI呼び出しにまとめる)
+_inflight: dict[str, asyncio.Future] = {}
+_writes = 0
+
+# 統計情報 (DB層を含めた全体のヒット/ミス)
+stats_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+def make_key(image_digest: str, text: str) -> str:
+    """
+    キャッシュキーを作成する
+    image_digest は画像データのSHA-256 (hex)
+    """
+    h = hashlib.sha256()
+    for part in (image_digest, text, ai_service.PROMPT_VERSION, ai_service.MODEL_NAME):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+async def _load(key: str) -> Optional[dict]:
+    """DBキャッシュから取得する (ヒットした場合は最終利用日時を更新)"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(TranslationCacheEntry.result_json).where(TranslationCacheEntry.cache_key == key))
+        result_json = result.scalar()
+        if result_json is None:
+            return None
+        await db.execute(
+            update(TranslationCacheEntry)
+            .where(TranslationCacheEntry.cache_key == key)
+            .values(last_hit_at=func.now())
+        )
+        await db.commit()
+        return json.loads(result_json)
+
+async def _save(key: str, ai_result: dict):
+    """DBキャッシュへ保存する"""
+    global _writes
+    async with AsyncSessionLocal() as db:
+        await db.merge(TranslationCacheEntry(
+            cache_key=key,
+            model_name=ai_service.MODEL_NAME,
+            result_json=json.dumps(ai_result, ensure_ascii=False),
+        ))
+        await db.commit()
+        _writes += 1
+        if _writes % _PRUNE_EVERY == 0:
+            await prune(db)
+
+async def prune(db: AsyncSession):
+    """
+    古いキャッシュを削除する
+    保持期間を過ぎたものと、最大件数を超えた分 (最終利用が古い順) を消します
+    """
+    expire_before = datetime.utcnow() - timedelta(days=TRANSLATION_CACHE_TTL_DAYS)
+    await db.execute(delete(TranslationCacheEntry).where(TranslationCacheEntry.last_hit_at < expire_before))
+
+    count = (await db.execute(select(func.count()).select_from(TranslationCacheEntry))).scalar()
+    overflow = count - TRANSLATION_CACHE_MAX_ROWS
+    if overflow > 0:
+        oldest = select(TranslationCacheEntry.cache_key).order_by(TranslationCacheEntry.last_hit_at).limit(overflow)
+        keys = (await db.execute(oldest)).scalars().all()
+        await db.execute(delete(TranslationCacheEntry).where(TranslationCacheEntry.cache_key.in_(keys)))
+    await db.commit()
+
+async def _compute(key: str, image_bytes: bytes, text: str) -> dict:
+    ai_result = await _load(key)
+    if ai_result is not None:
+        stats_counters["db_hits"] += 1
+    else:
+        stats_counters["misses"] += 1
+        ai_result = await ai_service.analyze_and_translate(image_bytes, text)
+        await _save(key, ai_result)
+    _memory.set(key, ai_result)
+    return ai_result
+
+async def analyze_and_translate(image_bytes: bytes, text: str, image_digest: Optional[str] = None) -> dict:
+    """
+    キャッシュ付きの ai_service.analyze_and_translate
+    同じ画像・コメントの再投稿ではGeminiを呼ばずに前回の結果を返します
+    """
+    if image_digest is None:
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+    key = make_key(image_digest, text)
+
+    ai_result = _memory.get(key)
+    if ai_result is not None:
+        stats_counters["memory_hits"] += 1
+        return ai_result
+
+    # 同じキーを計算中なら、その結果を待つ
+    future = _inflight.get(key)
+    if future is not None:
+        stats_counters["memory_hits"] += 1
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        ai_result = await _compute(key, image_bytes, text)
+        future.set_result(ai_result)
+        return ai_result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception() # 待ち手がいない場合の警告を抑制
+        raise
+    finally:
+        if not future.done():
+            future.cancel() # キャンセルされた場合も待ち手を解放する
+        del _inflight[key]
+
+def stats() -> dict:
+    """キャッシュの統計情報"""
+    total = sum(stats_counters.values())
+    hits = stats_counters["memory_hits"] + stats_counters["db_hits"]
+    return {
+        **stats_counters,
+        "memory_size": len(_memory),
+        "memory_evictions": _memory.evictions,
+        "hit_ratio": hits / total if total else 0.0,
+    }
@@ -0,0 +1,38 @@
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# 内容のハッシュ値 (SHA-256) をファイル名にした画像: <digest>.<ext> / <digest>_<派生名>.<ext>
+_CONTENT_ADDRESSED_RE = re.compile(r"^([0-9a-f]{64})(?:_([a-z]+))?\.([a-z0-9]+)$")
+
+# 1年間キャッシュさせる (内容が変わればファイル名も変わるため再検証は不要)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class ContentAddressedStaticFiles(StaticFiles):
+    """
+    静的ファイル配信 (画像用)
+    ファイル名が内容のハッシュ値になっているファイルは中身が変わらないため、
+    ハッシュ値から作った強いETagと Cache-Control: immutable を付けて配信します。
+    If-None-Match による304応答と Range リクエストにも対応します (FileResponseの機能)。
+    それ以外のファイル (以前のUUID名の画像など) は通常の StaticFiles と同じ扱いです。
+    """
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        match = _CONTENT_ADDRESSED_RE.match(str(full_path).replace("\\", "/").rsplit("/", 1)[-1])
+        if match is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        digest, variant, extension = match.groups()
+        etag = f'"{digest}-{variant}-{extension}"' if variant else f'"{digest}"'
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"etag": etag, "cache-control": IMMUTABLE_CACHE_CONTROL},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
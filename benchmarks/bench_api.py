@@ -0,0 +1,317 @@
+"""
+APIのオフライン負荷テスト (Geminiはスタブ、DBは一時的なSQLite)
+
+ネットワークに接続せずにアプリをプロセス内で起動し、店舗・記事を投入したSQLiteに対して
+シナリオごとに指定した並列数でリクエストを送り、スループットとレイテンシ (p50/p95/p99) を表示します。
+- shops: GET /shops/ (店舗一覧)
+- posts: GET /posts/ (記事フィード。言語指定・カーソルでの2ページ目を含む)
+- chat:  POST /chat/ (チャット。Geminiはスタブ)
+- auth:  POST /auth/token (ログイン。bcryptの検証を含む)
+- search: GET /posts/search (記事の全文検索。日本語・英語・中国語・韓国語の語、言語指定あり・なし)
+
+実行方法 (プロジェクトルートで):
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --scenarios posts,chat --concurrency 32 --requests 2000
+    python -m benchmarks.bench_api --save baseline.json
+    python -m benchmarks.bench_api --compare baseline.json  # 劣化していれば終了コード1
+
+chatシナリオのスループットはGeminiの流量制御 (GEMINI_RATE_PER_MINUTE, GEMINI_MAX_CONCURRENCY) の
+上限を超えません。アプリ自体の性能を測る場合は、環境変数で上限を引き上げて実行してください。
+    GEMINI_RATE_PER_MINUTE=100000 GEMINI_BURST=1000 python -m benchmarks.bench_api --scenarios chat
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+
+SCENARIOS = ("shops", "posts", "chat", "auth", "search")
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+CHAT_QUESTIONS = [
+    "おすすめのラーメン屋は？",
+    "免税店はありますか？",
+    "Where can I buy souvenirs?",
+    "Is there a good cafe nearby?",
+    "有什么好吃的？",
+    "맛있는 식당 추천해 주세요",
+    "雨の日に楽しめるお店は？",
+    "Where can I find vegetarian food?",
+]
+CATEGORIES = ["ラーメン", "カフェ", "雑貨", "居酒屋", "洋菓子", "古着", "書店", "和菓子", "焼肉", "ドラッグストア"]
+LANGS = [None, "en", "zh-tw", "ko"]
+# 記事の話題 (言語コード -> 語)。翻訳の本文に含め、search シナリオの検索語にも使う
+TOPICS = [
+    {"ja": "ラーメン", "en": "ramen", "zh-tw": "拉麵", "zh-cn": "拉面", "ko": "라멘"},
+    {"ja": "カフェ", "en": "cafe", "zh-tw": "咖啡廳", "zh-cn": "咖啡厅", "ko": "카페"},
+    {"ja": "和菓子", "en": "Japanese sweets", "zh-tw": "和菓子", "zh-cn": "和果子", "ko": "화과자"},
+    {"ja": "古着", "en": "vintage clothing", "zh-tw": "古著", "zh-cn": "古着", "ko": "빈티지 옷"},
+    {"ja": "焼肉", "en": "yakiniku", "zh-tw": "燒肉", "zh-cn": "烤肉", "ko": "야키니쿠"},
+    {"ja": "お土産", "en": "souvenirs", "zh-tw": "伴手禮", "zh-cn": "特产", "ko": "기념품"},
+    {"ja": "居酒屋", "en": "izakaya", "zh-tw": "居酒屋", "zh-cn": "居酒屋", "ko": "이자카야"},
+    {"ja": "抹茶パフェ", "en": "matcha parfait", "zh-tw": "抹茶聖代", "zh-cn": "抹茶芭菲", "ko": "말차 파르페"},
+]
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int
+    errors: int
+    concurrency: int
+    duration_s: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """ソート済みの値の百分位数 (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def _prepare_environment(args) -> str:
+    """アプリをimportする前に、一時的なDB・静的ファイルの置き場所を設定する"""
+    workdir = tempfile.mkdtemp(prefix="kamitori-bench-")
+    os.chdir(workdir) # static/ はカレントディレクトリからの相対パス
+    os.makedirs("static/images", exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ.setdefault("GEMINI_API_KEY", "bench-dummy-key") # スタブに差し替えるため使われない
+    os.environ.setdefault("DB_SCHEMA_MODE", "migrate")
+    return workdir
+
+async def seed(engine, shops: int, posts: int, rng: random.Random):
+    """店舗・記事・翻訳・ログイン用ユーザーをまとめて投入する"""
+    from sqlalchemy import insert
+
+    from app import auth, migrations
+    from app.languages import SOURCE_LANGUAGE, TRANSLATION_LANGUAGES
+    from app.models import Post, Shop, Translation, User
+
+    await migrations.upgrade(engine)
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    language_codes = [SOURCE_LANGUAGE.code] + [lang.code for lang in TRANSLATION_LANGUAGES]
+    async with engine.begin() as conn:
+        await conn.execute(insert(Shop), [
+            {
+                "name": f"店舗{i:04d}",
+                "category": rng.choice(CATEGORIES),
+                "location": f"上通町{i % 12 + 1}-{i % 30 + 1}",
+                "description": f"{rng.choice(CATEGORIES)}のお店です。上通商店街で{i % 50 + 1}年営業しています。" * 2,
+            }
+            for i in range(1, shops + 1)
+        ])
+        post_rows = [
+            {
+                "id": i,
+                "shop_id": rng.randint(1, shops),
+                "original_text": f"本日のおすすめ商品です #{i}",
+                "image_path": "/static/images/bench.jpg",
+                "created_at": now - datetime.timedelta(minutes=posts - i),
+            }
+            for i in range(1, posts + 1)
+        ]
+        for start in range(0, len(post_rows), 1000):
+            await conn.execute(insert(Post), post_rows[start:start + 1000])
+        post_topics = {i: rng.choice(TOPICS) for i in range(1, posts + 1)}
+        translation_rows = [
+            {
+                "post_id": i,
+                "language": code,
+                "translated_content": f"[{code}] {post_topics[i].get(code, post_topics[i]['en'])} 本日のおすすめ商品です。季節限定の味をぜひお試しください。 #{i}",
+            }
+            for i in range(1, posts + 1)
+            for code in language_codes
+        ]
+        for start in range(0, len(translation_rows), 1000):
+            await conn.execute(insert(Translation), translation_rows[start:start + 1000])
+        await conn.execute(insert(User), [{"email": BENCH_EMAIL, "hashed_password": auth.get_password_hash(BENCH_PASSWORD)}])
+
+def _request_factory(scenario: str, args, rng: random.Random):
+    """シナリオごとに、1回分のリクエストを送る関数を返す"""
+    counter = 0
+
+    async def shops(client):
+        return await client.get("/shops/", params={"limit": 50, "skip": rng.randrange(0, max(args.shops - 50, 1))})
+
+    async def posts(client):
+        params = {"limit": 20}
+        lang = rng.choice(LANGS)
+        if lang:
+            params["lang"] = lang
+        response = await client.get("/posts/", params=params)
+        # 3回に1回は無限スクロールの2ページ目も取得する
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor and rng.random() < 1 / 3:
+            response = await client.get("/posts/", params={**params, "cursor": next_cursor})
+        return response
+
+    async def chat(client):
+        nonlocal counter
+        counter += 1
+        message = rng.choice(CHAT_QUESTIONS)
+        if args.chat_unique:
+            message = f"{message} ({counter})" # 回答キャッシュに当たらないようにする
+        return await client.post("/chat/", json={"message": message})
+
+    async def auth(client):
+        return await client.post("/auth/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD})
+
+    async def search(client):
+        code, term = rng.choice(list(rng.choice(TOPICS).items()))
+        params = {"q": term, "limit": 20}
+        if rng.random() < 0.5:
+            params["lang"] = code
+        return await client.get("/posts/search", params=params)
+
+    return {"shops": shops, "posts": posts, "chat": chat, "auth": auth, "search": search}[scenario]
+
+async def run_scenario(client, scenario: str, args, rng: random.Random) -> ScenarioResult:
+    send = _request_factory(scenario, args, rng)
+    for _ in range(args.warmup):
+        await send(client)
+
+    remaining = args.requests
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await send(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception as e:
+                errors += 1
+                print(f"  {scenario}: {type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return ScenarioResult(
+        scenario=scenario,
+        requests=len(latencies),
+        errors=errors,
+        concurrency=args.concurrency,
+        duration_s=round(duration, 3),
+        rps=round(len(latencies) / duration, 1) if duration else 0.0,
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        p99_ms=round(percentile(latencies, 99), 2),
+        max_ms=round(latencies[-1], 2) if latencies else 0.0,
+    )
+
+async def run(args) -> list[ScenarioResult]:
+    import httpx
+
+    from app import database
+    from app.services import ai_service
+    from benchmarks.stub_gemini import StubClient
+
+    # SQLログを止める (計測結果に影響するため)
+    database.engine.sync_engine.echo = False
+    stub = StubClient(latency_ms=args.gemini_latency_ms, jitter_ms=args.gemini_jitter_ms, seed=args.seed)
+    ai_service.client = stub
+
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    await seed(database.engine, args.shops, args.posts, rng)
+    print(f"Seeded {args.shops} shops and {args.posts} posts in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for scenario in args.scenarios:
+                result = await run_scenario(client, scenario, args, rng)
+                results.append(result)
+                print(
+                    f"{result.scenario:6} {result.requests:6d} req  {result.errors:4d} err  "
+                    f"{result.rps:8.1f} req/s  p50 {result.p50_ms:8.2f}ms  p95 {result.p95_ms:8.2f}ms  "
+                    f"p99 {result.p99_ms:8.2f}ms  max {result.max_ms:8.2f}ms"
+                )
+    print(f"Gemini stub calls: {stub.stats.calls} (+{stub.stats.stream_calls} streaming)")
+    return results
+
+def compare(results: list[ScenarioResult], baseline_path: str, tolerance: float) -> list[str]:
+    """基準の結果と比べて、p95 が (1 + tolerance) 倍を超えたシナリオ、スループットが (1 - tolerance) 倍を下回ったシナリオを返す"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {item["scenario"]: item for item in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get(result.scenario)
+        if base is None:
+            continue
+        if result.p95_ms > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result.scenario}: p95 {base['p95_ms']}ms -> {result.p95_ms}ms")
+        if result.rps < base["rps"] * (1 - tolerance):
+            regressions.append(f"{result.scenario}: throughput {base['rps']} -> {result.rps} req/s")
+        if result.errors > base["errors"]:
+            regressions.append(f"{result.scenario}: errors {base['errors']} -> {result.errors}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="実行するシナリオ (カンマ区切り)")
+    parser.add_argument("--requests", type=int, default=500, help="シナリオごとのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時に送るリクエスト数")
+    parser.add_argument("--warmup", type=int, default=10, help="計測前に送るリクエスト数")
+    parser.add_argument("--shops", type=int, default=200, help="投入する店舗数")
+    parser.add_argument("--posts", type=int, default=5000, help="投入する記事数")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300, help="スタブGeminiの平均遅延")
+    parser.add_argument("--gemini-jitter-ms", type=float, default=100, help="スタブGeminiの遅延のばらつき (±)")
+    parser.add_argument("--chat-unique", action="store_true", help="チャットの質問を毎回変えて回答キャッシュを使わない")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--save", help="結果をJSONで保存するファイル")
+    parser.add_argument("--compare", help="比較する基準の結果 (--save で保存したJSON)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="--compare で許容する劣化の割合")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    # 相対パスはカレントディレクトリを移動する前に解決しておく
+    save_path = os.path.abspath(args.save) if args.save else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    project_root = os.getcwd()
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    workdir = _prepare_environment(args)
+    print(f"Working directory: {workdir}")
+
+    results = asyncio.run(run(args))
+
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": [asdict(result) for result in results]}, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {save_path}")
+    if compare_path:
+        regressions = compare(results, compare_path, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {compare_path} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
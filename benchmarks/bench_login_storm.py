@@ -0,0 +1,69 @@
+"""
+ログイン集中時のイベントループ遅延ベンチマーク
+
+大量のパスワード検証 (bcrypt) を同時に実行しながら、別のコルーチンで
+「10ms sleep が実際には何ms遅れたか」を計測します。
+- inline:   async関数内で verify_password を直接呼ぶ (従来の実装)
+- executor: verify_password_async で専用スレッドプールに逃がす (現在の実装)
+
+実行方法 (プロジェクトルートで):
+    python -m benchmarks.bench_login_storm --logins 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app import auth
+
+TICK_SECONDS = 0.01
+
+async def _measure_loop_lag(stop: asyncio.Event, lags: list[float]):
+    """他のリクエストの代わりに、sleepの遅れ (=イベントループが止まっていた時間) を記録する"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+async def _login_inline(password: str, hashed: str):
+    return auth.verify_password(password, hashed)
+
+async def _login_executor(password: str, hashed: str):
+    return await auth.verify_password_async(password, hashed)
+
+async def run(mode: str, logins: int, hashed: str) -> dict:
+    login = _login_inline if mode == "inline" else _login_executor
+    stop = asyncio.Event()
+    lags: list[float] = []
+    probe = asyncio.create_task(_measure_loop_lag(stop, lags))
+    await asyncio.sleep(TICK_SECONDS * 3) # 計測を先に始めておく
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login("password123", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    assert all(results)
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(lags), 2),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1], 2),
+        "lag_max_ms": round(lags[-1], 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=20, help="同時ログイン数")
+    args = parser.parse_args()
+
+    hashed = auth.get_password_hash("password123")
+    print(f"BCRYPT_MAX_CONCURRENCY={auth.BCRYPT_MAX_CONCURRENCY}")
+    for mode in ("inline", "executor"):
+        print(asyncio.run(run(mode, args.logins, hashed)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+一覧APIのシリアライズのマイクロベンチマーク (通常のパス と FAST_LIST_SERIALIZATION の高速パス の比較)
+
+一時的なSQLiteに店舗・記事を投入し、同じページを両方のパスで繰り返し作成して1回あたりの時間を比較します。
+- service: DBからの取得 + JSONの作成 (記事はETag・gzipを含むページの作成まで)
+- http:    GET /posts/ (記事一覧キャッシュなし), GET /shops/ をプロセス内で呼び出した場合
+両方のパスのJSONがバイト単位で同じであることも確認します。
+
+実行方法 (プロジェクトルートで):
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --limit 100 --iterations 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+def _timed(samples: list[float]):
+    """計測用のコンテキスト (経過時間をミリ秒で samples に追加する)"""
+    class _Timer:
+        def __enter__(self):
+            self.started = time.perf_counter()
+        def __exit__(self, *exc):
+            samples.append((time.perf_counter() - self.started) * 1000)
+    return _Timer()
+
+async def run(args):
+    import httpx
+
+    from app import database, serialization
+    from app.services import feed_cache_service, post_service, shop_service
+    from benchmarks.bench_api import seed
+
+    database.engine.sync_engine.echo = False
+    await seed(database.engine, args.shops, args.posts, random.Random(0))
+
+    async def posts_page(fast: bool, lang):
+        async with database.AsyncSessionLocal() as db:
+            if fast:
+                rows, next_cursor = await post_service.get_post_rows(db, limit=args.limit, lang=lang)
+                return feed_cache_service.make_page(serialization.dumps(rows), next_cursor).body
+            posts, next_cursor = await post_service.get_posts(db, limit=args.limit, lang=lang)
+            return feed_cache_service.build_page(posts, next_cursor).body
+
+    async def shops_page(fast: bool, _lang):
+        from pydantic import TypeAdapter
+        from app.schemas.shop import ShopResponse
+
+        async with database.AsyncSessionLocal() as db:
+            if fast:
+                rows, _ = await shop_service.get_shop_rows(db, limit=args.limit)
+                return serialization.dumps(rows)
+            # FastAPIの response_model と同じく、検証 → JSON互換の値 → 標準のjsonでエンコード
+            shops, _ = await shop_service.get_shops(db, limit=args.limit)
+            adapter = TypeAdapter(list[ShopResponse])
+            data = adapter.dump_python(adapter.validate_python(shops, from_attributes=True), mode="json")
+            return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    cases = [("posts", posts_page, None), ("posts?lang=en", posts_page, "en"), ("shops", shops_page, None)]
+    print(f"service layer (limit={args.limit}, {args.iterations} iterations, median / p95 ms)")
+    for name, build, lang in cases:
+        results = {}
+        for fast in (False, True):
+            await build(fast, lang) # ウォームアップ
+            samples: list[float] = []
+            for _ in range(args.iterations):
+                with _timed(samples):
+                    body = await build(fast, lang)
+            results[fast] = (statistics.median(samples), sorted(samples)[int(len(samples) * 0.95) - 1], body)
+        same = results[False][2] == results[True][2]
+        (base, base_p95, _), (fast, fast_p95, _) = results[False], results[True]
+        print(f"  {name:14} current {base:7.2f} / {base_p95:7.2f}   fast {fast:7.2f} / {fast_p95:7.2f}   "
+              f"x{base / fast:.2f}   same JSON: {same}")
+
+    from app.main import app
+
+    print(f"http layer (GET with limit={args.limit}, feed cache disabled)")
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, path, params in [("posts", "/posts/", {}), ("posts?lang=en", "/posts/", {"lang": "en"}), ("shops", "/shops/", {})]:
+                medians = {}
+                for fast in (False, True):
+                    serialization.FAST_LIST_SERIALIZATION = fast
+                    samples = []
+                    for _ in range(args.iterations):
+                        with _timed(samples):
+                            response = await client.get(path, params={"limit": args.limit, **params})
+                        response.raise_for_status()
+                    medians[fast] = statistics.median(samples)
+                print(f"  {name:14} current {medians[False]:7.2f}   fast {medians[True]:7.2f}   x{medians[False] / medians[True]:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=100, help="1ページの件数")
+    parser.add_argument("--iterations", type=int, default=100, help="計測の繰り返し回数")
+    parser.add_argument("--shops", type=int, default=200, help="投入する店舗数")
+    parser.add_argument("--posts", type=int, default=2000, help="投入する記事数")
+    args = parser.parse_args()
+
+    project_root = os.getcwd()
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from benchmarks.bench_api import _prepare_environment
+
+    os.environ["FEED_CACHE_PAGES"] = "0" # 記事一覧のキャッシュを使わずに毎回作成する
+    workdir = _prepare_environment(args)
+    print(f"Working directory: {workdir}")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
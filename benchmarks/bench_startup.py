@@ -0,0 +1,163 @@
+"""
+APIワーカーの起動時間 (import app.main) の計測と予算チェック
+
+新しいPythonプロセスで `python -X importtime -c "import app.main"` を繰り返し実行し、
+モジュールごとの読み込み時間 (中央値) を表示します。
+- app.main の読み込み時間 (ms) が --budget-ms を超えたら失敗
+- 起動時に読み込まないはずのモジュール (--forbid、既定は google.genai) が読み込まれていたら失敗
+- --compare で保存済みの結果と比べ、全体または app.* のモジュールが (1 + tolerance) 倍を超えて遅くなったら失敗
+いずれかで失敗した場合は終了コード1を返すため、CIやデプロイ前のチェックに使えます。
+
+実行方法 (プロジェクトルートで):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --budget-ms 1200
+    python -m benchmarks.bench_startup --save startup.json
+    python -m benchmarks.bench_startup --compare startup.json  # 劣化していれば終了コード1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+TARGET_MODULE = "app.main"
+# 起動時の読み込み時間の予算 (ms)。google-genai を起動時に読み込んでいた頃は約2000ms
+DEFAULT_BUDGET_MS = 1500
+# 起動時に読み込まれてはいけないモジュール (最初のAI呼び出しで読み込む)
+DEFAULT_FORBIDDEN = ("google.genai",)
+# --compare でモジュール単位の劣化として扱う最小の差 (ms)。小さいモジュールの揺らぎを無視する
+MIN_MODULE_DELTA_MS = 20
+
+def _prepare_environment(project_root: str) -> tuple[str, dict]:
+    """子プロセス用の作業ディレクトリ (static/ と一時的なDB) と環境変数"""
+    workdir = tempfile.mkdtemp(prefix="kamitori-startup-")
+    os.makedirs(os.path.join(workdir, "static", "images"), exist_ok=True)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, env.get("PYTHONPATH")]))
+    env["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/startup.db"
+    env.setdefault("GEMINI_API_KEY", "bench-dummy-key")
+    env.pop("PYTHONIMPORTTIME", None)
+    return workdir, env
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """-X importtime の出力を {モジュール名: (自身の時間, 累積時間)} (マイクロ秒) にする"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue # 見出しの行
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+def measure_once(workdir: str, env: dict) -> tuple[float, dict[str, tuple[int, int]]]:
+    """1回分の計測 (プロセス全体の時間 ms, モジュールごとの時間)"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET_MODULE}"],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {TARGET_MODULE} failed:\n{completed.stderr[-2000:]}")
+    return wall_ms, parse_importtime(completed.stderr)
+
+def summarize(runs: list[tuple[float, dict[str, tuple[int, int]]]]) -> dict:
+    """複数回の計測の中央値 (ms)"""
+    cumulative: dict[str, list[float]] = defaultdict(list)
+    packages: dict[str, list[float]] = defaultdict(list)
+    for _, modules in runs:
+        per_package: dict[str, float] = defaultdict(float)
+        for name, (self_us, cumulative_us) in modules.items():
+            cumulative[name].append(cumulative_us / 1000)
+            per_package[name.split(".")[0]] += self_us / 1000
+        for package, ms in per_package.items():
+            packages[package].append(ms)
+
+    def median(values: list[float]) -> float:
+        # 一部の回でだけ読み込まれたモジュールは、読み込まれなかった回を0として扱う
+        return round(statistics.median(values + [0.0] * (len(runs) - len(values))), 1)
+
+    return {
+        "total_ms": median(cumulative[TARGET_MODULE]),
+        "process_ms": round(statistics.median(wall for wall, _ in runs), 1),
+        "modules": {name: median(values) for name, values in cumulative.items() if name.split(".")[0] == "app"},
+        "packages": {package: median(values) for package, values in packages.items()},
+        "imported": sorted(cumulative),
+    }
+
+def check(summary: dict, budget_ms: float, forbidden: list[str]) -> list[str]:
+    """予算の超過と、読み込まれてはいけないモジュールを返す"""
+    failures = []
+    if summary["total_ms"] > budget_ms:
+        failures.append(f"import {TARGET_MODULE}: {summary['total_ms']}ms exceeds the budget of {budget_ms}ms")
+    imported = set(summary["imported"])
+    for name in forbidden:
+        if name in imported:
+            failures.append(f"{name} is imported at startup (it should be loaded on first use)")
+    return failures
+
+def compare(summary: dict, baseline_path: str, tolerance: float) -> list[str]:
+    """基準の結果と比べて、(1 + tolerance) 倍を超えて遅くなった全体・モジュールを返す"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["summary"]
+    regressions = []
+    if summary["total_ms"] > baseline["total_ms"] * (1 + tolerance):
+        regressions.append(f"import {TARGET_MODULE}: {baseline['total_ms']}ms -> {summary['total_ms']}ms")
+    for name, ms in summary["modules"].items():
+        base = baseline["modules"].get(name, 0.0)
+        if ms > base * (1 + tolerance) and ms - base >= MIN_MODULE_DELTA_MS:
+            regressions.append(f"{name}: {base}ms -> {ms}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="計測の回数 (中央値を使う)")
+    parser.add_argument("--top", type=int, default=15, help="表示するモジュール・パッケージの数")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help=f"import {TARGET_MODULE} の予算 (ms)")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN), help="起動時に読み込まれてはいけないモジュール (カンマ区切り)")
+    parser.add_argument("--save", help="結果をJSONで保存するファイル")
+    parser.add_argument("--compare", help="比較する基準の結果 (--save で保存したJSON)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="--compare で許容する劣化の割合")
+    args = parser.parse_args()
+
+    project_root = os.getcwd()
+    workdir, env = _prepare_environment(project_root)
+    print(f"Working directory: {workdir}")
+
+    measure_once(workdir, env) # ウォームアップ (.pyc の作成を計測に含めない)
+    summary = summarize([measure_once(workdir, env) for _ in range(args.runs)])
+
+    print(f"import {TARGET_MODULE}: {summary['total_ms']}ms (process incl. interpreter startup: {summary['process_ms']}ms, "
+          f"median of {args.runs} runs)")
+    print("app modules (cumulative ms):")
+    for name, ms in sorted(summary["modules"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:45} {ms:8.1f}")
+    print("packages (self ms, summed over modules):")
+    for package, ms in sorted(summary["packages"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:45} {ms:8.1f}")
+
+    failures = check(summary, args.budget_ms, [name.strip() for name in args.forbid.split(",") if name.strip()])
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "summary": summary}, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        regressions = compare(summary, args.compare, args.tolerance)
+        failures += [f"REGRESSION {line}" for line in regressions]
+        if not regressions:
+            print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    for line in failures:
+        print(f"FAIL {line}")
+    if failures:
+        sys.exit(1)
+    print(f"Within the startup budget ({args.budget_ms}ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+ベンチマーク用のGeminiスタブ (ネットワークに接続せず、指定した遅延で応答を返す)
+
+ai_service.client と同じ呼び出し方 (client.models.generate_content /
+client.aio.models.generate_content / client.aio.models.generate_content_stream) に対応しています。
+response_schema が指定された場合は、スキーマに沿ったダミーのJSONを返します。
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+@dataclass
+class StubResponse:
+    text: str
+
+class StubStats:
+    """スタブへの呼び出し回数 (ベンチマーク結果の確認用)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.stream_calls = 0
+
+    def record(self, stream: bool = False):
+        with self._lock:
+            if stream:
+                self.stream_calls += 1
+            else:
+                self.calls += 1
+
+def _fake_value(schema: dict, ids: list[int]):
+    kind = str(schema.get("type", "STRING")).upper()
+    if kind == "OBJECT":
+        return {key: _fake_value(prop, ids) for key, prop in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        # 記事の一括翻訳 (translate_posts) は入力と同じIDの要素を返す必要がある
+        items = []
+        for post_id in ids or [0]:
+            item = _fake_value(schema.get("items", {}), ids)
+            if isinstance(item, dict) and "id" in item:
+                item["id"] = post_id
+            items.append(item)
+        return items
+    if kind in ("INTEGER", "NUMBER"):
+        return 0
+    if kind == "BOOLEAN":
+        return True
+    return "これはベンチマーク用のダミー応答です。 This is a stub response for benchmarking."
+
+def _input_ids(contents) -> list[int]:
+    """入力のJSON配列 ([{"id": ..., "text": ...}, ...]) からIDを取り出す"""
+    for content in contents or []:
+        for part in getattr(content, "parts", None) or []:
+            text = getattr(part, "text", None) or ""
+            if text.startswith("["):
+                try:
+                    return [item["id"] for item in json.loads(text)]
+                except (ValueError, KeyError, TypeError):
+                    pass
+    return []
+
+def _response_text(contents, config) -> str:
+    schema = getattr(config, "response_schema", None) if config is not None else None
+    if getattr(config, "response_mime_type", None) == "application/json" and isinstance(schema, dict):
+        return json.dumps(_fake_value(schema, _input_ids(contents)), ensure_ascii=False)
+    return "上通商店街には多くの魅力的なお店があります。ぜひ散策してみてください！"
+
+class _Models:
+    def __init__(self, client: "StubClient"):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        self._client.stats.record()
+        time.sleep(self._client.delay())
+        return StubResponse(_response_text(contents, config))
+
+class _AioModels:
+    def __init__(self, client: "StubClient"):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        self._client.stats.record()
+        await asyncio.sleep(self._client.delay())
+        return StubResponse(_response_text(contents, config))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self._client.stats.record(stream=True)
+        text = _response_text(contents, config)
+        delay = self._client.delay()
+        chunk_count = self._client.stream_chunks
+
+        async def chunks():
+            # 最初のチャンクまでに遅延の大半がかかり、残りは少しずつ届く想定
+            await asyncio.sleep(delay * 0.7)
+            size = max(len(text) // chunk_count, 1)
+            for i in range(0, len(text), size):
+                yield StubResponse(text[i:i + size])
+                await asyncio.sleep(delay * 0.3 / chunk_count)
+
+        return chunks()
+
+class _Aio:
+    def __init__(self, client: "StubClient"):
+        self.models = _AioModels(client)
+
+class StubClient:
+    """
+    genai.Client の代わりに使うスタブ
+    latency_ms ± jitter_ms (一様分布) の遅延の後に応答を返します
+    """
+
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 100, stream_chunks: int = 8, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.stream_chunks = stream_chunks
+        self.stats = StubStats()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.models = _Models(self)
+        self.aio = _Aio(self)
+
+    def delay(self) -> float:
+        """1回の呼び出しの遅延 (秒)"""
+        with self._random_lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(self.latency_ms + jitter, 0) / 1000
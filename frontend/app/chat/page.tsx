@@ -14,11 +14,16 @@ interface Message {
     content: string;
 }
 
+// セッションが見つからない場合 (別のワーカー・再起動・期限切れ) に会話を引き継ぐため、直近の発言も一緒に送る
+const HISTORY_LIMIT = 10;
+
 export default function ChatPage() {
     const [messages, setMessages] = useState<Message[]>([
         { role: 'bot', content: 'こんにちは！上通商栄会へようこそ。おすすめのお店や観光スポットについて何でも聞いてください！' }
     ]);
     const [input, setInput] = useState('');
+    // 会話履歴はサーバー側で保持するので、通常はセッションIDで続きとして扱われる
+    const [sessionId, setSessionId] = useState<string | null>(null);
     const [loading, setLoading] = useState(false);
     const scrollRef = useRef<HTMLDivElement>(null);
 
@@ -27,9 +32,9 @@ export default function ChatPage() {
 
         const userMsg = input;
         // 最新のメッセージ(userMsg)はAPI側でmessageフィールドとして受け取るので、
-        // ここでは「画面に表示されている過去ログ」を送る。
+        // ここでは「画面に表示されている過去ログ」の直近の分を送る。
         // フロントエンドの role: 'bot' を バックエンド期待の 'model' に変換する
-        const historyPayload = messages.map(msg => ({
+        const historyPayload = messages.slice(-HISTORY_LIMIT).map(msg => ({
             role: msg.role === 'bot' ? 'model' : 'user',
             content: msg.content
         }));
@@ -39,7 +44,8 @@ export default function ChatPage() {
         setLoading(true);
 
         try {
-            const res = await api.post('/chat', { message: userMsg, history: historyPayload });
+            const res = await api.post('/chat', { message: userMsg, session_id: sessionId, history: historyPayload });
+            if (res.data.session_id) setSessionId(res.data.session_id);
             setMessages(prev => [...prev, { role: 'bot', content: res.data.response }]);
         } catch (error) {
             console.error("Chat error", error);
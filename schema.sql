@@ -1,13 +1,19 @@
 -- Database Schema for Kamitori Connect
--- Corresponds to SQLAlchemy models in app/models.py
+-- Corresponds to SQLAlchemy models in app/models.py (schema version 6, see app/migrations)
 -- Target Database: MySQL (Production), SQLite (Development - compatible syntax mostly)
+-- 通常は python -m app.migrations upgrade でスキーマを作成してください
 
 CREATE TABLE IF NOT EXISTS shops (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     description TEXT,
     location VARCHAR(255),
-    category VARCHAR(100)
+    category VARCHAR(100),
+    map_url VARCHAR(500),
+    reservation_url VARCHAR(500),
+    INDEX ix_shops_id (id),
+    INDEX ix_shops_name (name),
+    INDEX ix_shops_category (category)
 );
 
 CREATE TABLE IF NOT EXISTS posts (
@@ -15,7 +21,13 @@ CREATE TABLE IF NOT EXISTS posts (
     shop_id INT NOT NULL,
     original_text TEXT NOT NULL,
     image_path VARCHAR(255),
+    image_variants JSON NULL COMMENT 'e.g., {"thumb": {"webp": "...", "jpeg": "..."}}',
+    status VARCHAR(16) NOT NULL DEFAULT 'published' COMMENT 'pending (draft awaiting AI generation) or published',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_posts_id (id),
+    INDEX ix_posts_created_at_id (created_at, id),
+    INDEX ix_posts_shop_id_created_at (shop_id, created_at),
+    FULLTEXT INDEX ft_posts_original_text (original_text) WITH PARSER ngram,
     FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
 );
 
@@ -24,5 +36,38 @@ CREATE TABLE IF NOT EXISTS translations (
     post_id INT NOT NULL,
     language VARCHAR(10) NOT NULL COMMENT 'e.g., en, zh-tw',
     translated_content TEXT NOT NULL,
+    INDEX ix_translations_id (id),
+    INDEX ix_translations_post_id_language (post_id, language),
+    FULLTEXT INDEX ft_translations_translated_content (translated_content) WITH PARSER ngram,
     FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
 );
+
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) NOT NULL,
+    hashed_password VARCHAR(255) NOT NULL,
+    INDEX ix_users_id (id),
+    UNIQUE INDEX ix_users_email (email)
+);
+
+CREATE TABLE IF NOT EXISTS translation_cache (
+    cache_key VARCHAR(64) PRIMARY KEY COMMENT 'SHA-256 (hex)',
+    model_name VARCHAR(100) NOT NULL,
+    result_json TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_translation_cache_last_hit_at (last_hit_at)
+);
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+INSERT INTO schema_migrations (version, description, applied_at) VALUES
+    (1, 'initial tables', CURRENT_TIMESTAMP),
+    (2, 'posts.image_variants and translation_cache', CURRENT_TIMESTAMP),
+    (3, 'indexes for feed and translation queries', CURRENT_TIMESTAMP),
+    (4, 'full-text search indexes for posts and translations', CURRENT_TIMESTAMP),
+    (5, 'indexes for the shop directory', CURRENT_TIMESTAMP),
+    (6, 'posts.status for drafts awaiting AI generation', CURRENT_TIMESTAMP);
@@ -0,0 +1,10 @@
+"""
+テスト共通の設定
+アプリをimportする前に一時的なDBを設定します (全てのテストモジュールで同じDBを使います)
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="kamitori-test-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/test.db"
+os.environ.setdefault("GEMINI_API_KEY", "test-dummy-key")
@@ -0,0 +1,50 @@
+"""
+一覧APIの高速パス (FAST_LIST_SERIALIZATION) が通常のパスと同じレスポンスを返すことの確認
+
+実行方法 (プロジェクトルートで):
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+from app import database, migrations, serialization
+from app.models import Post, Shop, Translation
+from app.services import feed_cache_service, post_service
+
+# 言語コード順とも登録順とも一致しない順序で翻訳を登録する
+TRANSLATION_ORDER = ["zh-tw", "en", "ko", "ja", "zh-cn"]
+
+async def _seed():
+    await migrations.upgrade(database.engine)
+    async with database.AsyncSessionLocal() as db:
+        shop = Shop(name="テスト商店", category="雑貨")
+        db.add(shop)
+        await db.flush()
+        for i in range(3):
+            post = Post(shop_id=shop.id, original_text=f"投稿{i}", image_path=f"/static/images/{i}.jpg")
+            db.add(post)
+            await db.flush()
+            for lang in TRANSLATION_ORDER[i:] + TRANSLATION_ORDER[:i]:
+                db.add(Translation(post_id=post.id, language=lang, translated_content=f"{lang} {i}"))
+        await db.commit()
+
+async def _both_pages(lang):
+    async with database.AsyncSessionLocal() as db:
+        posts, next_cursor = await post_service.get_posts(db, limit=2, lang=lang)
+        orm_page = feed_cache_service.build_page(posts, next_cursor)
+    async with database.AsyncSessionLocal() as db:
+        rows, next_cursor = await post_service.get_post_rows(db, limit=2, lang=lang)
+        fast_page = feed_cache_service.make_page(serialization.dumps(rows), next_cursor)
+    return orm_page, fast_page
+
+@pytest.fixture(scope="module")
+def seeded():
+    asyncio.run(_seed())
+
+@pytest.mark.parametrize("lang", [None, "en", "zh-cn"])
+def test_fast_path_matches_orm_path(seeded, lang):
+    orm_page, fast_page = asyncio.run(_both_pages(lang))
+    assert fast_page.body == orm_page.body
+    assert fast_page.etag == orm_page.etag
+    assert fast_page.next_cursor == orm_page.next_cursor
@@ -0,0 +1,123 @@
+"""
+店舗の一括インポート (CSV / JSON Lines) の確認
+
+実行方法 (プロジェクトルートで):
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+from sqlalchemy.future import select
+
+from app import database, migrations
+from app.models import Shop
+from app.services import shop_import_service
+from app.services.shop_import_service import InvalidImportFile
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def _import(text: str, fmt: str = "csv", size: int = 4096, bom: bool = False):
+    data = ("\ufeff" if bom else "").encode("utf-8") + text.encode("utf-8")
+
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            return await shop_import_service.import_shops(db, _chunks(data, size), fmt)
+    return asyncio.run(run())
+
+def _shops(*names: str) -> dict[str, Shop]:
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            result = await db.execute(select(Shop).where(Shop.name.in_(names)))
+            return {shop.name: shop for shop in result.scalars()}
+    return asyncio.run(run())
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    asyncio.run(migrations.upgrade(database.engine))
+
+# 1バイトずつ (行の途中・マルチバイト文字の途中で切れる) と、まとめて1チャンクの両方で確認する
+@pytest.mark.parametrize("size", [1, 5, 4096])
+@pytest.mark.parametrize("bom", [False, True])
+def test_quoted_multiline_field(size, bom):
+    name = f"複数行の店 {size} {bom}"
+    text = (
+        "Name,Description,Category\n"
+        f'"{name}","1行目\n2行目, ""引用""\n",食品\n'
+        f"次の店 {size} {bom},説明,雑貨"  # 最後の行に改行がない
+    )
+    result = _import(text, size=size, bom=bom)
+    assert (result.total, result.inserted, result.failed) == (2, 2, 0), result.errors
+    shops = _shops(name, f"次の店 {size} {bom}")
+    assert shops[name].description == '1行目\n2行目, "引用"'
+    assert shops[name].category == "食品"
+    assert shops[f"次の店 {size} {bom}"].category == "雑貨"
+
+def test_quote_inside_unquoted_field():
+    result = _import('name,description\n12" Pizza Shop,big pizza\nB" shop,x\n')
+    assert (result.inserted, result.failed) == (2, 0), result.errors
+    assert set(_shops('12" Pizza Shop', 'B" shop')) == {'12" Pizza Shop', 'B" shop'}
+
+def test_partial_update_keeps_existing_values():
+    _import("name,description,location,category\n部分更新の店,元の説明,2階,飲食\n")
+    result = _import("name,description,category\n部分更新の店,,カフェ\n")
+    assert (result.inserted, result.updated, result.duplicates) == (0, 1, 0)
+    shop = _shops("部分更新の店")["部分更新の店"]
+    assert (shop.description, shop.location, shop.category) == ("元の説明", "2階", "カフェ")
+
+def test_duplicate_names_are_counted_once(monkeypatch):
+    # バッチをまたいだ重複も確認する
+    monkeypatch.setattr(shop_import_service, "SHOP_IMPORT_BATCH_SIZE", 2)
+    _import("name,category\n既存の重複店,A\n")
+    result = _import(
+        "name,category,location\n"
+        "重複店,A,1階\n"
+        "重複店,B,\n"
+        "既存の重複店,B,\n"
+        "重複店,C,\n"
+        "既存の重複店,C,3階\n"
+    )
+    assert (result.total, result.inserted, result.updated, result.duplicates) == (5, 1, 1, 3)
+    shops = _shops("重複店", "既存の重複店")
+    assert (shops["重複店"].category, shops["重複店"].location) == ("C", "1階")
+    assert (shops["既存の重複店"].category, shops["既存の重複店"].location) == ("C", "3階")
+
+def test_error_report():
+    result = _import(
+        "name,category\n"
+        ",空の店名\n"
+        f"長すぎる店,{'x' * 300}\n"
+        '"改行を含む\n店",OK\n'
+        "a\rb,不正なレコード\n"
+        "列が多い店,a,b\n"
+        "取り込める店,OK\n"
+        '"閉じていない店,x\n'
+    )
+    assert (result.total, result.inserted, result.failed) == (7, 2, 5)
+    assert [(error.row, error.name) for error in result.errors] == [
+        (2, None), (3, "長すぎる店"), (6, None), (7, None), (9, None),
+    ]
+    assert "category" in result.errors[1].error
+    assert "Unterminated" in result.errors[-1].error
+    assert set(_shops("改行を含む\n店", "取り込める店")) == {"改行を含む\n店", "取り込める店"}
+
+def test_unknown_csv_column_rejects_file():
+    with pytest.raises(InvalidImportFile, match="catgory"):
+        _import("name,catgory\n列名を間違えた店,雑貨\n")
+    assert not _shops("列名を間違えた店")
+
+def test_jsonl():
+    result = _import(
+        '{"name": "JSONの店", "category": "雑貨"}\n'
+        "{not json}\n"
+        '{"name": "列名を間違えたJSONの店", "catgory": "雑貨"}\n'
+        "\n"
+        '{"name": "JSONの店", "location": "1階"}',
+        fmt="jsonl", size=3,
+    )
+    assert (result.total, result.inserted, result.duplicates, result.failed) == (4, 1, 1, 2)
+    assert [error.row for error in result.errors] == [2, 3]
+    assert "catgory" in result.errors[1].error
+    shop = _shops("JSONの店")["JSONの店"]
+    assert (shop.category, shop.location) == ("雑貨", "1階")